@@ -8,13 +8,15 @@ Documentation: https://pypi.org/project/pytrends/
 """
 
 from pytrends.request import TrendReq
+from pytrends.exceptions import TooManyRequestsError
 import pandas as pd
 import time
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import logging
-import json
+import orjson
+import io
 from dotenv import load_dotenv
 import os
 
@@ -75,6 +77,8 @@ class TrendsFetcher:
     RATE_LIMIT_DELAY = 2.0  # 2 seconds between requests to avoid blocking
     MAX_RETRIES = 3
     BACKOFF_FACTOR = 3
+    TAIL_BLOCK_SIZE = 64 * 1024  # Bytes read per step when scanning CSV tails
+    MAX_BATCH_TERMS = 5  # Google Trends accepts up to 5 keywords per payload
     
     def __init__(self, raw_dir: str, geo: str = 'US'):
         """
@@ -86,12 +90,24 @@ class TrendsFetcher:
         """
         self.raw_dir = Path(raw_dir)
         self.raw_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Batched scores are relative across terms, so they are kept apart from
+        # the per-term files that preprocess_trends.py consumes
+        self.batch_dir = self.raw_dir / 'batched'
         self.geo = geo
         
+        # Optional proxy ring (comma-separated TRENDS_PROXIES); Google Trends
+        # rate limits per IP, so a 429 can be retried right away on another proxy
+        self.proxies = [p.strip() for p in os.getenv('TRENDS_PROXIES', '').split(',') if p.strip()]
+        if self.proxies:
+            logger.info(f"Using {len(self.proxies)} proxies for Google Trends requests")
+        
         # Initialize pytrends
-        self.pytrends = TrendReq(hl='en-US', tz=360)
+        self.pytrends = TrendReq(hl='en-US', tz=360, proxies=self.proxies)
         
-        # Track last request time for rate limiting
+        # Track last request time for rate limiting. pytrends moves to the next
+        # proxy after every successful request, so which proxy a fetch will use
+        # isn't known up front; keep one global delay across all proxies
         self.last_request_time = 0
     
     def _rate_limit(self):
@@ -101,30 +117,128 @@ class TrendsFetcher:
             time.sleep(self.RATE_LIMIT_DELAY - elapsed)
         self.last_request_time = time.time()
     
-    def get_last_fetch_date(self, term_key: str) -> Optional[str]:
+    def _rotate_proxy(self, error: Exception, retry_count: int) -> bool:
         """
-        Get the date of the last fetched data for a term
+        Switch to the next proxy if a request was rate limited
+        
+        Args:
+            error: Exception raised by the failed request
+            retry_count: Current retry attempt
+            
+        Returns:
+            True if the new proxy has not been tried in this retry cycle
+            (retry right away), False if the caller should back off
+        """
+        is_rate_limited = isinstance(error, TooManyRequestsError) or '429' in str(error)
+        if not (self.proxies and is_rate_limited):
+            return False
+        
+        self.pytrends.GetNewProxy()
+        logger.warning(f"Rate limited (429), switching to proxy {self.pytrends.proxy_index + 1}/{len(self.proxies)}")
+        
+        # Once every proxy has been tried the rotation wraps around, so back off
+        return retry_count < len(self.proxies) - 1
+    
+    def _read_metadata(self, term_key: str, data_dir: Optional[Path] = None) -> Dict:
+        """
+        Read the saved metadata for a term
         
         Args:
             term_key: Term key from SEARCH_TERMS
+            data_dir: Directory holding the term files (default: raw_dir)
             
         Returns:
-            Last date (YYYY-MM-DD) or None if no data exists
+            Metadata dictionary (empty if none exists or it cannot be read)
         """
-        metadata_file = self.raw_dir / f"{term_key}_metadata.json"
+        metadata_file = (data_dir or self.raw_dir) / f"{term_key}_metadata.json"
         
         if not metadata_file.exists():
-            return None
+            return {}
         
         try:
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-                return metadata.get('last_date')
+            return orjson.loads(metadata_file.read_bytes())
         except Exception as e:
             logger.warning(f"Could not read metadata for {term_key}: {e}")
-            return None
+            return {}
+    
+    def get_last_fetch_date(self, term_key: str, data_dir: Optional[Path] = None) -> Optional[str]:
+        """
+        Get the date of the last fetched data for a term
+        
+        Args:
+            term_key: Term key from SEARCH_TERMS
+            data_dir: Directory holding the term files (default: raw_dir)
+            
+        Returns:
+            Last date (YYYY-MM-DD) or None if no data exists
+        """
+        return self._read_metadata(term_key, data_dir).get('last_date')
+    
+    def _read_tail(self, data_file: Path, cutoff: str) -> Tuple[int, pd.DataFrame]:
+        """
+        Read only the trailing rows of a date-sorted CSV that may overlap new data
+        
+        Scans backwards from the end of the file in blocks until a row dated
+        before the cutoff is found, so I/O scales with new rows, not history.
+        
+        Args:
+            data_file: Existing term CSV (sorted by date)
+            cutoff: Earliest date (YYYY-MM-DD) that can overlap the new data
+            
+        Returns:
+            Tuple of (byte offset where the tail starts, DataFrame of tail rows)
+        """
+        with open(data_file, 'rb') as f:
+            header = f.readline()
+            data_start = f.tell()
+            date_idx = header.decode('utf-8').strip().split(',').index('date')
+            
+            pos = f.seek(0, io.SEEK_END)
+            offset = data_start
+            carry = b''  # Leading partial line of the previous block
+            tail_parts = []  # Complete tail rows, last block first
+            
+            while pos > data_start:
+                # Read only the next block, never the already-scanned bytes
+                block_start = max(data_start, pos - self.TAIL_BLOCK_SIZE)
+                f.seek(block_start)
+                block = f.read(pos - block_start) + carry
+                pos = block_start
+                
+                # Unless we reached the first data row, the block starts mid-line
+                if pos == data_start:
+                    carry = b''
+                else:
+                    newline = block.find(b'\n')
+                    if newline == -1:
+                        carry = block
+                        continue
+                    carry, block = block[:newline + 1], block[newline + 1:]
+                
+                # Skip every complete row dated before the cutoff
+                skipped = 0
+                for line in block.splitlines(keepends=True):
+                    fields = line.decode('utf-8').strip().split(',')
+                    if len(fields) > date_idx and fields[date_idx] >= cutoff:
+                        break
+                    skipped += len(line)
+                
+                tail_parts.append(block[skipped:])
+                if skipped:
+                    offset = pos + len(carry) + skipped
+                    break
+        
+        tail = pd.read_csv(io.BytesIO(header + b''.join(reversed(tail_parts))))
+        tail['date'] = pd.to_datetime(tail['date'], format='%Y-%m-%d')
+        return offset, tail
     
-    def save_term_data(self, term_key: str, data: pd.DataFrame, metadata: Dict):
+    def save_term_data(
+        self,
+        term_key: str,
+        data: pd.DataFrame,
+        metadata: Dict,
+        data_dir: Optional[Path] = None
+    ):
         """
         Save term data and metadata
         
@@ -132,35 +246,55 @@ class TrendsFetcher:
             term_key: Term key from SEARCH_TERMS
             data: DataFrame with trends data
             metadata: Fetch metadata
+            data_dir: Directory to save the term files in (default: raw_dir)
         """
+        data_dir = data_dir or self.raw_dir
+        
         # Save data as CSV
-        data_file = self.raw_dir / f"{term_key}_data.csv"
+        data_file = data_dir / f"{term_key}_data.csv"
+        
+        data['date'] = pd.to_datetime(data.index)
+        data = data.reset_index(drop=True)
         
-        # Load existing data if file exists
+        # Existing rows are only needed from the first new date onwards, so merge
+        # against the file tail and rewrite it in place instead of the whole file
         if data_file.exists():
             try:
-                existing_data = pd.read_csv(data_file, parse_dates=['date'])
+                cutoff = (data['date'].min() - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+                offset, existing_tail = self._read_tail(data_file, cutoff)
                 
                 # Merge and deduplicate
-                data['date'] = pd.to_datetime(data.index)
-                data = data.reset_index(drop=True)
-                
-                combined = pd.concat([existing_data, data], ignore_index=True)
+                combined = pd.concat([existing_tail, data], ignore_index=True)
                 combined = combined.drop_duplicates(subset=['date'], keep='last')
-                combined = combined.sort_values('date')
+                combined = combined.sort_values('date')[existing_tail.columns]
+                
+                # Serialize before touching the file so a failure leaves it intact
+                rows = combined.to_csv(header=False, index=False, date_format='%Y-%m-%d').encode('utf-8')
                 
-                data = combined
+                with open(data_file, 'r+b') as f:
+                    f.truncate(offset)
+                    f.seek(offset)
+                    f.write(rows)
             except Exception as e:
-                logger.warning(f"Could not load existing data: {e}")
+                # Never fall back to overwriting the file with only the new rows
+                logger.error(f"Could not merge with existing data in {data_file}: {e}")
+                raise
+            
+            previous_total = self._read_metadata(term_key, data_dir).get('total_records')
+            if previous_total is not None:
+                total_records = previous_total - len(existing_tail) + len(combined)
+            else:
+                # No metadata to carry the count forward, count rows once
+                with open(data_file, 'rb') as f:
+                    total_records = sum(1 for _ in f) - 1
+            last_date = combined['date'].max()
         else:
-            data['date'] = pd.to_datetime(data.index)
-            data = data.reset_index(drop=True)
-        
-        # Save merged data
-        data.to_csv(data_file, index=False)
+            data.to_csv(data_file, index=False, date_format='%Y-%m-%d')
+            total_records = len(data)
+            last_date = data['date'].max()
         
         # Save metadata
-        metadata_file = self.raw_dir / f"{term_key}_metadata.json"
+        metadata_file = data_dir / f"{term_key}_metadata.json"
         
         term_info = self.SEARCH_TERMS[term_key]
         metadata_to_save = {
@@ -171,16 +305,58 @@ class TrendsFetcher:
             'is_topic': term_info.get('is_topic', False),
             'description': term_info['description'],
             'geo': self.geo,
-            'last_date': data['date'].max().strftime('%Y-%m-%d'),
-            'total_records': len(data),
+            'last_date': last_date.strftime('%Y-%m-%d'),
+            'total_records': total_records,
             'fetched_at': datetime.now().isoformat(),
             'fetch_metadata': metadata
         }
         
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata_to_save, f, indent=2)
+        metadata_file.write_bytes(
+            orjson.dumps(metadata_to_save, option=orjson.OPT_INDENT_2, default=str)
+        )
         
-        logger.info(f"  Saved {len(data)} records to {data_file}")
+        logger.info(f"  Saved {total_records} records to {data_file}")
+    
+    def _get_timeframe_start(
+        self,
+        term_key: str,
+        start_date: Optional[str] = None,
+        incremental: bool = True,
+        data_dir: Optional[Path] = None
+    ) -> str:
+        """
+        Determine the start of the fetch window for a term
+        
+        Args:
+            term_key: Term key from SEARCH_TERMS
+            start_date: Start date (YYYY-MM-DD) for full fetches
+            incremental: If True, start the day after the last fetched date
+            data_dir: Directory holding the term files (default: raw_dir)
+            
+        Returns:
+            Start date (YYYY-MM-DD)
+        """
+        if incremental:
+            last_date = self.get_last_fetch_date(term_key, data_dir)
+            if last_date:
+                # Fetch from day after last date
+                start_dt = datetime.strptime(last_date, '%Y-%m-%d') + timedelta(days=1)
+                timeframe_start = start_dt.strftime('%Y-%m-%d')
+                logger.info(f"Incremental update from {timeframe_start}")
+            else:
+                # No previous data, fetch last 90 days
+                timeframe_start = (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d')
+                logger.info(f"No previous data, fetching last 90 days")
+        else:
+            # Full fetch
+            if start_date:
+                timeframe_start = start_date
+            else:
+                # Default: last 5 years
+                timeframe_start = (datetime.now() - timedelta(days=365*5)).strftime('%Y-%m-%d')
+            logger.info(f"Full fetch from {timeframe_start}")
+        
+        return timeframe_start
     
     def fetch_term(
         self,
@@ -210,25 +386,7 @@ class TrendsFetcher:
         logger.info(f"{'='*60}")
         
         # Determine time range
-        if incremental:
-            last_date = self.get_last_fetch_date(term_key)
-            if last_date:
-                # Fetch from day after last date
-                start_dt = datetime.strptime(last_date, '%Y-%m-%d') + timedelta(days=1)
-                timeframe_start = start_dt.strftime('%Y-%m-%d')
-                logger.info(f"Incremental update from {timeframe_start}")
-            else:
-                # No previous data, fetch last 90 days
-                timeframe_start = (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d')
-                logger.info(f"No previous data, fetching last 90 days")
-        else:
-            # Full fetch
-            if start_date:
-                timeframe_start = start_date
-            else:
-                # Default: last 5 years
-                timeframe_start = (datetime.now() - timedelta(days=365*5)).strftime('%Y-%m-%d')
-            logger.info(f"Full fetch from {timeframe_start}")
+        timeframe_start = self._get_timeframe_start(term_key, start_date, incremental)
         
         # End date
         if end_date:
@@ -280,26 +438,143 @@ class TrendsFetcher:
             
         except Exception as e:
             if retry_count < self.MAX_RETRIES:
-                wait_time = self.BACKOFF_FACTOR ** retry_count
-                logger.warning(f"Request failed: {e}. Retrying in {wait_time}s...")
-                time.sleep(wait_time)
+                # On 429 move to an untried proxy instead of sleeping
+                if not self._rotate_proxy(e, retry_count):
+                    wait_time = self.BACKOFF_FACTOR ** retry_count
+                    logger.warning(f"Request failed: {e}. Retrying in {wait_time}s...")
+                    time.sleep(wait_time)
                 self.fetch_term(term_key, start_date, end_date, incremental, retry_count + 1)
             else:
                 logger.error(f"Failed after {self.MAX_RETRIES} retries: {e}")
                 raise
     
-    def fetch_all(self, incremental: bool = True):
+    def fetch_batch(
+        self,
+        term_keys: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        incremental: bool = True,
+        retry_count: int = 0
+    ):
+        """
+        Fetch trends data for several terms with a single request
+        
+        Google Trends scales every keyword in a payload against the most
+        searched one, so batched scores are relative across the terms rather
+        than each term peaking at 100 as with fetch_term. They are saved under
+        batch_dir with their own metadata and incremental state, never merged
+        into the per-term files in raw_dir.
+        
+        Args:
+            term_keys: Term keys from SEARCH_TERMS (at most MAX_BATCH_TERMS)
+            start_date: Start date (YYYY-MM-DD)
+            end_date: End date (YYYY-MM-DD)
+            incremental: If True, fetch only new data since the oldest last update
+            retry_count: Current retry attempt
+        """
+        if len(term_keys) > self.MAX_BATCH_TERMS:
+            raise ValueError(f"At most {self.MAX_BATCH_TERMS} terms per batch, got {len(term_keys)}")
+        
+        logger.info(f"\n{'='*60}")
+        logger.info(f"Fetching batch: {', '.join(term_keys)}")
+        logger.info(f"{'='*60}")
+        
+        # One window must cover every term, so start from the earliest one
+        timeframe_start = min(
+            self._get_timeframe_start(term_key, start_date, incremental, self.batch_dir)
+            for term_key in term_keys
+        )
+        
+        # End date
+        if end_date:
+            timeframe_end = end_date
+        else:
+            timeframe_end = datetime.now().strftime('%Y-%m-%d')
+        
+        timeframe = f"{timeframe_start} {timeframe_end}"
+        
+        # Rate limit
+        self._rate_limit()
+        
+        try:
+            # Build payload with all terms
+            kw_list = [self.SEARCH_TERMS[term_key]['term'] for term_key in term_keys]
+            self.pytrends.build_payload(
+                kw_list=kw_list,
+                cat=0,  # All categories
+                timeframe=timeframe,
+                geo=self.geo,
+                gprop=''  # Web search
+            )
+            
+            # Get interest over time
+            logger.info(f"  Fetching data for timeframe: {timeframe}")
+            data = self.pytrends.interest_over_time()
+            
+            if data.empty:
+                logger.info("  No data returned")
+                return
+            
+            logger.info(f"  Retrieved {len(data)} data points per term")
+            
+            # Split the batched response column-wise, one batch file per term
+            self.batch_dir.mkdir(exist_ok=True)
+            for term_key, search_term in zip(term_keys, kw_list):
+                if search_term not in data.columns:
+                    logger.warning(f"  No data returned for {term_key}")
+                    continue
+                
+                term_data = data[[search_term]].rename(columns={search_term: 'interest_score'})
+                
+                metadata = {
+                    'timeframe': timeframe,
+                    'geo': self.geo,
+                    'records_fetched': len(term_data),
+                    'batch': term_keys
+                }
+                
+                self.save_term_data(term_key, term_data, metadata, self.batch_dir)
+            
+        except Exception as e:
+            if retry_count < self.MAX_RETRIES:
+                # On 429 move to an untried proxy instead of sleeping
+                if not self._rotate_proxy(e, retry_count):
+                    wait_time = self.BACKOFF_FACTOR ** retry_count
+                    logger.warning(f"Request failed: {e}. Retrying in {wait_time}s...")
+                    time.sleep(wait_time)
+                self.fetch_batch(term_keys, start_date, end_date, incremental, retry_count + 1)
+            else:
+                logger.error(f"Failed after {self.MAX_RETRIES} retries: {e}")
+                raise
+    
+    def fetch_all(self, incremental: bool = True, batched: bool = False):
         """
         Fetch all configured search terms
         
         Args:
             incremental: If True, only fetch new data since last update
+            batched: If True, fetch up to MAX_BATCH_TERMS terms per request
+                (scores become relative across terms and are saved under
+                batch_dir, see fetch_batch)
         """
         logger.info("Starting Google Trends data fetch...")
         logger.info(f"Mode: {'Incremental' if incremental else 'Full download'}")
         logger.info(f"Terms to fetch: {len(self.SEARCH_TERMS)}")
         logger.info(f"Geographic region: {self.geo}")
         
+        if batched:
+            term_keys = list(self.SEARCH_TERMS.keys())
+            for i in range(0, len(term_keys), self.MAX_BATCH_TERMS):
+                batch = term_keys[i:i + self.MAX_BATCH_TERMS]
+                try:
+                    self.fetch_batch(batch, incremental=incremental)
+                except Exception as e:
+                    logger.error(f"Error fetching batch {batch}: {e}")
+                    # Continue with other batches
+            
+            logger.info("\n✅ Google Trends data fetch complete!")
+            return
+        
         for term_key in self.SEARCH_TERMS.keys():
             try:
                 self.fetch_term(term_key, incremental=incremental)
@@ -329,6 +604,8 @@ def main():
                        help='Geographic region (default: US)')
     parser.add_argument('--test', action='store_true',
                        help='Test mode: fetch last 30 days only')
+    parser.add_argument('--batch', action='store_true',
+                       help='Fetch all terms in batched requests (relative scores, saved to trends_raw/batched/)')
     
     args = parser.parse_args()
     
@@ -354,7 +631,7 @@ def main():
     
     # Fetch data
     if args.term == 'all':
-        fetcher.fetch_all(incremental=incremental)
+        fetcher.fetch_all(incremental=incremental, batched=args.batch)
     else:
         fetcher.fetch_term(
             args.term,
@@ -3,6 +3,7 @@ Get all available metrics from BigQuery
 """
 from google.cloud import bigquery
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,7 +17,8 @@ WHERE region_type = 'msa'
 ORDER BY metric_type
 """
 
-df = client.query(query).to_dataframe()
-print("Available metrics:")
-for metric in df['metric_type'].tolist():
-    print(f"  - {metric}")
+# Repeated runs are served from BigQuery's cached results
+job_config = bigquery.QueryJobConfig(use_query_cache=True)
+
+df = client.query(query, job_config=job_config).to_dataframe()
+sys.stdout.write("Available metrics:\n" + ''.join(f"  - {metric}\n" for metric in df['metric_type']))
@@ -10,8 +10,14 @@ Output: Parquet file in fred_processed/ with normalized schema
 
 import pandas as pd
 import numpy as np
+import openpyxl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 import logging
 
 # Configure logging
@@ -54,6 +60,17 @@ class FREDPreprocessor:
         }
     }
     
+    # Parquet schema matching the BigQuery table (date32 loads as DATE)
+    PARQUET_SCHEMA = pa.schema([
+        ('series_id', pa.dictionary(pa.int32(), pa.string())),
+        ('series_name', pa.string()),
+        ('date', pa.date32()),
+        ('value', pa.float64()),
+        ('frequency', pa.string()),
+        ('units', pa.string()),
+        ('last_updated', pa.timestamp('us')),
+    ])
+    
     # Sheet name to frequency mapping
     SHEET_FREQUENCY_MAP = {
         'Annual': 'annual',
@@ -79,61 +96,114 @@ class FREDPreprocessor:
         if not self.excel_file.exists():
             raise FileNotFoundError(f"Excel file not found: {self.excel_file}")
     
-    def process_sheet(self, sheet_name: str, frequency: str) -> pd.DataFrame:
+    def open_workbook(self) -> openpyxl.Workbook:
+        """
+        Open the Excel file for streaming reads
+        
+        Returns:
+            Read-only workbook (caller is responsible for closing it)
+        """
+        return openpyxl.load_workbook(self.excel_file, read_only=True, data_only=True)
+    
+    def process_sheet(
+        self,
+        sheet_name: str,
+        frequency: str,
+        workbook: Optional[openpyxl.Workbook] = None
+    ) -> pd.DataFrame:
         """
         Process a single sheet from the Excel file
         
+        Rows are streamed from the sheet and emitted directly in long format,
+        skipping empty cells, so the wide sheet is never materialized.
+        
         Args:
             sheet_name: Name of the Excel sheet
             frequency: Frequency of the data (weekly/monthly/quarterly/annual)
+            workbook: Already opened workbook (opened and closed here if None)
             
         Returns:
             DataFrame in long format with normalized schema
         """
         logger.info(f"Processing sheet: {sheet_name} (frequency: {frequency})...")
         
-        # Read the sheet
-        df = pd.read_excel(self.excel_file, sheet_name=sheet_name)
+        if workbook is None:
+            workbook = self.open_workbook()
+            try:
+                return self.process_sheet(sheet_name, frequency, workbook)
+            finally:
+                workbook.close()
+        
+        # Stream the sheet
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, ())
+        columns = [col for col in header if col is not None]
         
-        logger.info(f"  Loaded {len(df)} rows with {len(df.columns)} columns")
-        logger.info(f"  Columns: {df.columns.tolist()}")
+        logger.info(f"  Columns: {columns}")
         
         # Get series columns (all except observation_date)
-        series_cols = [col for col in df.columns if col != 'observation_date']
+        series_cols = [
+            (idx, col) for idx, col in enumerate(header)
+            if col is not None and col != 'observation_date'
+        ]
         
-        if not series_cols:
+        if not series_cols or 'observation_date' not in header:
             logger.warning(f"  No data columns found in {sheet_name}, skipping")
             return pd.DataFrame()
         
-        logger.info(f"  Found {len(series_cols)} series: {series_cols}")
+        logger.info(f"  Found {len(series_cols)} series: {[col for _, col in series_cols]}")
         
-        # Transform from wide to long format
-        df_long = pd.melt(
-            df,
-            id_vars=['observation_date'],
-            value_vars=series_cols,
-            var_name='series_id',
-            value_name='value'
-        )
+        # Transform from wide to long format while reading, dropping empty cells
+        date_idx = header.index('observation_date')
+        dates, series_ids, values = [], [], []
+        row_count = 0
         
-        # Add frequency column
-        df_long['frequency'] = frequency
+        for row in rows:
+            observation_date = row[date_idx]
+            if observation_date is None:
+                continue
+            row_count += 1
+            
+            for idx, series_id in series_cols:
+                value = row[idx] if idx < len(row) else None
+                if value is None:
+                    continue
+                dates.append(observation_date)
+                series_ids.append(series_id)
+                values.append(value)
+        
+        logger.info(f"  Loaded {row_count} rows with {len(columns)} columns")
+        
+        df_long = pd.DataFrame({
+            'observation_date': pd.to_datetime(dates),
+            'series_id': series_ids,
+            'value': pd.to_numeric(pd.Series(values, dtype='object'), errors='coerce'),
+        })
         
-        # Convert date to datetime
-        df_long['observation_date'] = pd.to_datetime(df_long['observation_date'])
+        # Non-numeric cells (e.g. '#N/A') were coerced to NaN; drop them with a
+        # plain NumPy mask (NaN != NaN) instead of dropna's indexer machinery
+        vals = df_long['value'].to_numpy()
+        mask = vals == vals
+        if not mask.all():
+            df_long = df_long.iloc[mask].reset_index(drop=True)
+        
+        # Add frequency column (shared categories keep the dtype through concat)
+        df_long['frequency'] = pd.Categorical(
+            [frequency] * len(df_long),
+            categories=list(self.SHEET_FREQUENCY_MAP.values())
+        )
         
         # Add metadata for each series
-        df_long['series_name'] = df_long['series_id'].map(
-            lambda x: self.SERIES_METADATA.get(x, {}).get('name', x)
-        )
-        df_long['units'] = df_long['series_id'].map(
-            lambda x: self.SERIES_METADATA.get(x, {}).get('units', 'unknown')
-        )
+        df_long['series_name'] = df_long['series_id'].map({
+            series_id: self.SERIES_METADATA.get(series_id, {}).get('name', series_id)
+            for _, series_id in series_cols
+        })
+        df_long['units'] = df_long['series_id'].map({
+            series_id: self.SERIES_METADATA.get(series_id, {}).get('units', 'unknown')
+            for _, series_id in series_cols
+        })
         
-        # Remove rows with null values
-        initial_rows = len(df_long)
-        df_long = df_long.dropna(subset=['value'])
-        removed_rows = initial_rows - len(df_long)
+        removed_rows = row_count * len(series_cols) - len(df_long)
         
         if removed_rows > 0:
             logger.info(f"  Removed {removed_rows:,} rows with null values")
@@ -158,15 +228,22 @@ class FREDPreprocessor:
         
         all_data = []
         
-        # Process each frequency sheet
-        for sheet_name, frequency in self.SHEET_FREQUENCY_MAP.items():
-            try:
-                df = self.process_sheet(sheet_name, frequency)
-                if not df.empty:
-                    all_data.append(df)
-            except Exception as e:
-                logger.error(f"Error processing {sheet_name}: {e}")
-                # Continue with other sheets
+        # Sheets are independent, so parse them in parallel worker processes
+        # (each worker opens its own read-only workbook)
+        with ProcessPoolExecutor(max_workers=len(self.SHEET_FREQUENCY_MAP)) as executor:
+            futures = {
+                sheet_name: executor.submit(self.process_sheet, sheet_name, frequency)
+                for sheet_name, frequency in self.SHEET_FREQUENCY_MAP.items()
+            }
+            
+            for sheet_name, future in futures.items():
+                try:
+                    df = future.result()
+                    if not df.empty:
+                        all_data.append(df)
+                except Exception as e:
+                    logger.error(f"Error processing {sheet_name}: {e}")
+                    # Continue with other sheets
         
         if not all_data:
             raise ValueError("No data was processed from any sheet")
@@ -186,20 +263,32 @@ class FREDPreprocessor:
             'observation_date': 'date'
         })
         
-        # Convert date to string format (YYYY-MM-DD) to avoid Parquet INT64/INT32 mismatch
-        # BigQuery will parse this as DATE type
-        combined_df['date'] = combined_df['date'].dt.strftime('%Y-%m-%d')
+        # Add last_updated timestamp truncated to seconds (YYYY-MM-DD HH:MM:SS in CSV)
+        combined_df['last_updated'] = pd.Timestamp(datetime.now().replace(microsecond=0))
+        
+        # Categories are sorted, so dictionary codes order the same as the series IDs
+        combined_df['series_id'] = pd.Categorical(
+            combined_df['series_id'],
+            categories=sorted(combined_df['series_id'].unique())
+        )
+        
+        # Convert once with the explicit schema (date as date32, avoiding the
+        # INT64/INT32 mismatch; series_id dictionary-encoded)
+        table = pa.Table.from_pandas(combined_df, schema=self.PARQUET_SCHEMA, preserve_index=False)
         
         # Sort by date first, then by series_id to interleave series
         # This ensures all series appear in the first 100 rows for BigQuery schema detection
-        combined_df = combined_df.sort_values(['date', 'series_id'])
-        
-        # Add last_updated timestamp in BigQuery-compatible format (without microseconds)
-        # Use ISO 8601 format: YYYY-MM-DD HH:MM:SS
-        combined_df['last_updated'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # Sorting on date32 + dictionary codes in Arrow never touches the string data
+        sort_keys = pa.table({
+            'date': table['date'],
+            'series_code': table['series_id'].combine_chunks().indices,
+        })
+        sort_order = pc.sort_indices(sort_keys, sort_keys=[('date', 'ascending'), ('series_code', 'ascending')])
+        table = table.take(sort_order)
+        combined_df = combined_df.take(sort_order.to_numpy())
         
         logger.info(f"\nTotal rows: {len(combined_df):,}")
-        logger.info(f"Date range: {combined_df['date'].min()} to {combined_df['date'].max()}")
+        logger.info(f"Date range: {combined_df['date'].min():%Y-%m-%d} to {combined_df['date'].max():%Y-%m-%d}")
         logger.info(f"Unique series: {combined_df['series_id'].nunique()}")
         logger.info(f"Series: {combined_df['series_id'].unique().tolist()}")
         
@@ -208,7 +297,13 @@ class FREDPreprocessor:
         output_path = self.processed_dir / output_filename
         
         if save_format == 'parquet':
-            combined_df.to_parquet(output_path, index=False, compression='snappy')
+            pq.write_table(
+                table,
+                output_path,
+                compression='zstd',
+                compression_level=3,
+                use_dictionary=True
+            )
         elif save_format == 'csv':
             # Write CSV with explicit parameters for BigQuery compatibility
             combined_df.to_csv(
@@ -234,20 +329,23 @@ class FREDPreprocessor:
         logger.info(f"  Null values: {combined_df.isnull().sum().sum()}")
         logger.info(f"  Duplicate rows: {combined_df.duplicated().sum()}")
         
-        # Print statistics by series
+        # Print statistics by series (single pass over the data)
         logger.info("\nObservations by series:")
-        for series_id in combined_df['series_id'].unique():
-            series_data = combined_df[combined_df['series_id'] == series_id]
-            series_name = series_data['series_name'].iloc[0]
-            frequency = series_data['frequency'].iloc[0]
-            # Date is now a string, so just use min/max directly
-            date_range = f"{series_data['date'].min()} to {series_data['date'].max()}"
-            
-            logger.info(f"  {series_id} ({frequency}):")
-            logger.info(f"    Name: {series_name}")
-            logger.info(f"    Count: {len(series_data):,} observations")
-            logger.info(f"    Date range: {date_range}")
-            logger.info(f"    Value range: {series_data['value'].min():.2f} to {series_data['value'].max():.2f}")
+        summary = combined_df.groupby('series_id', observed=True, sort=False).agg(
+            series_name=('series_name', 'first'),
+            frequency=('frequency', 'first'),
+            observations=('value', 'size'),
+            date_min=('date', 'min'),
+            date_max=('date', 'max'),
+            value_min=('value', 'min'),
+            value_max=('value', 'max'),
+        )
+        for series in summary.itertuples():
+            logger.info(f"  {series.Index} ({series.frequency}):")
+            logger.info(f"    Name: {series.series_name}")
+            logger.info(f"    Count: {series.observations:,} observations")
+            logger.info(f"    Date range: {series.date_min:%Y-%m-%d} to {series.date_max:%Y-%m-%d}")
+            logger.info(f"    Value range: {series.value_min:.2f} to {series.value_max:.2f}")
         
         return combined_df
 
@@ -264,8 +362,8 @@ def main():
         processed_dir=str(processed_dir)
     )
     
-    # Process all sheets - use CSV format to avoid Parquet type issues
-    df = preprocessor.process_all(save_format='csv')
+    # Process all sheets
+    df = preprocessor.process_all(save_format='parquet')
     
     logger.info("\n✅ Preprocessing complete!")
     logger.info(f"Output saved to: {processed_dir / 'fred_combined.parquet'}")
@@ -7,13 +7,27 @@ Transforms raw Reddit JSON into post-level CSV with extracted metadata.
 - Preserves full text for LLM analysis
 """
 
-import json
+import os
+import pickle
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import logging
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+try:
+    from ahocorasick_rs import AhoCorasick, MatchKind
+except ImportError:  # fall back to a single trie-compressed regex
+    AhoCorasick = None
+
+try:
+    import re2
+except ImportError:  # fall back to the backtracking re engine
+    re2 = re
 
 # Configure logging
 logging.basicConfig(
@@ -23,9 +37,102 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def build_trie_regex(words: List[str]) -> str:
+    """
+    Build a compact regex alternation matching any of the given words
+    
+    Words sharing a prefix are grouped through a prefix trie, e.g.
+    ['san diego', 'san jose'] -> 'san\\ (?:diego|jose)'. Optional suffixes are
+    greedy, so longer names are tried before names they start with.
+    
+    Args:
+        words: Words to match (non-empty)
+        
+    Returns:
+        Regex pattern string (without word boundaries)
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}  # End-of-word marker
+    
+    def to_regex(node: Dict) -> str:
+        alternatives = [re.escape(char) + to_regex(node[char]) for char in sorted(node) if char]
+        if not alternatives:
+            return ''
+        
+        if len(alternatives) == 1:
+            pattern = alternatives[0]
+            if '' in node:
+                pattern = f"(?:{pattern})?"
+        else:
+            pattern = f"(?:{'|'.join(alternatives)})"
+            if '' in node:
+                pattern += '?'
+        return pattern
+    
+    return to_regex(trie)
+
+
+class AsciiTranslationTable(dict):
+    """
+    str.translate table that drops any character not explicitly mapped
+    
+    Non-ASCII code points are looked up lazily and cached as deletions, so
+    the table stays small instead of covering all of Unicode.
+    """
+    
+    def __missing__(self, codepoint: int) -> None:
+        self[codepoint] = None
+        return None
+
+
 class RedditPreprocessor:
     """Handles preprocessing of raw Reddit data"""
     
+    # Unicode characters replaced with ASCII equivalents by normalize_text
+    TEXT_REPLACEMENTS = {
+        '\u201c': '"', '\u201d': '"',   # Double quotes
+        '\u2018': "'", '\u2019': "'",   # Single quotes
+        '\u2032': "'", '\u2033': '"',   # Prime marks
+        '\u2013': '-', '\u2014': '--',  # En/em dashes
+        '\u2026': '...',               # Ellipsis
+        '\u00a0': ' ',                 # Non-breaking space
+    }
+    
+    # Prices with K/M suffix, e.g. $450K, $450k, 450K, $1.2M
+    # (RE2 runs in linear time; long digit/whitespace runs make re backtrack)
+    _RE_PRICE_KM = re2.compile(r'\$?\s*(\d+(?:\.\d+)?)\s*([KkMm])')
+    
+    # Full prices, e.g. $450,000 or $450000
+    _RE_PRICE_FULL = re2.compile(r'\$\s*(\d{1,3}(?:,\d{3})+|\d{5,})')
+    
+    # "City, ST" mentions, e.g. Austin, TX or San Francisco, CA
+    _RE_CITY_STATE = re.compile(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*),\s*([A-Z]{2})\b')
+    
+    # Extraction method for each supported subreddit
+    SUBREDDIT_EXTRACTORS = {
+        'FirstTimeHomeBuyer': 'process_firsttimehomebuyer_posts',
+        'SameGrassButGreener': 'process_samegrassbutgreener_posts'
+    }
+    
+    # Pickled city lookups, stored next to uscities.csv
+    CITIES_CACHE_FILE = 'uscities_cache.pkl'
+    
+    # Posts per worker task when extracting metadata in parallel
+    CHUNK_SIZE = 1000
+    
+    # Rows per chunk when writing the output CSV
+    CSV_CHUNK_SIZE = 50_000
+    
+    # Raw post fields used by the preprocessor
+    RAW_POST_FIELDS = [
+        'id', 'created_utc', 'title', 'selftext', 'score',
+        'num_comments', 'author', 'permalink'
+    ]
+    
     def __init__(self, raw_dir: str, processed_dir: str):
         """
         Initialize preprocessor
@@ -38,6 +145,13 @@ class RedditPreprocessor:
         self.processed_dir = Path(processed_dir)
         self.processed_dir.mkdir(parents=True, exist_ok=True)
         
+        # Translation table for normalize_text: keep printable ASCII, newlines
+        # and tabs, map known Unicode characters, drop everything else
+        self._tr = AsciiTranslationTable({codepoint: codepoint for codepoint in range(32, 128)})
+        self._tr.update({ord('\n'): ord('\n'), ord('\t'): ord('\t')})
+        self._tr.update({codepoint: None for codepoint in range(32) if codepoint not in self._tr})
+        self._tr.update(str.maketrans(self.TEXT_REPLACEMENTS))
+        
         # Load US cities data from CSV
         self._load_cities_data()
     
@@ -48,7 +162,6 @@ class RedditPreprocessor:
         if not cities_file.exists():
             logger.warning(f"uscities.csv not found at {cities_file}, using fallback city list")
             # Fallback to basic list
-            self.cities_df = None
             self.us_states = {
                 'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA',
                 'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD',
@@ -57,34 +170,154 @@ class RedditPreprocessor:
                 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY', 'DC'
             }
             self.city_to_state = {}
+            self.city_proper = {}
             return
         
         try:
-            # Load cities CSV
-            df = pd.read_csv(cities_file)
-            
-            # Filter to cities with population >= 200,000 for faster processing
-            # This reduces from ~31K cities to ~226 major cities
-            self.cities_df = df[df['population'] >= 200000].copy()
-            
-            logger.info(f"Loaded {len(self.cities_df)} US cities (population >= 200K) from uscities.csv")
-            logger.info(f"Filtered from {len(df)} total cities")
+            # Reuse lookups pickled by a previous run unless uscities.csv changed
+            cache_file = cities_file.with_name(self.CITIES_CACHE_FILE)
+            source_mtime = cities_file.stat().st_mtime_ns
+            cache = self._read_cities_cache(cache_file, source_mtime)
             
-            # Create set of valid state abbreviations
-            self.us_states = set(self.cities_df['state_id'].unique())
+            if cache is not None:
+                self.us_states = cache['us_states']
+                self.city_to_state = cache['city_to_state']
+                self.city_proper = cache['city_proper']
+                logger.info(f"Loaded {len(self.city_to_state)} US cities from {cache_file.name}")
+            else:
+                # Load cities CSV
+                df = pd.read_csv(cities_file)
+                
+                # Filter to cities with population >= 200,000 for faster processing
+                # This reduces from ~31K cities to ~226 major cities
+                cities_df = df[df['population'] >= 200000]
+                
+                logger.info(f"Loaded {len(cities_df)} US cities (population >= 200K) from uscities.csv")
+                logger.info(f"Filtered from {len(df)} total cities")
+                
+                # Create set of valid state abbreviations
+                self.us_states = set(cities_df['state_id'].unique())
+                
+                # Create city-to-state mapping (city_ascii -> state_id)
+                # Use city_ascii for better matching (handles special characters)
+                self.city_to_state = dict(zip(
+                    cities_df['city_ascii'].str.lower(),
+                    cities_df['state_id']
+                ))
+                
+                # Lowercase name -> properly capitalized name (city_ascii)
+                self.city_proper = dict(zip(
+                    cities_df['city_ascii'].str.lower(),
+                    cities_df['city_ascii']
+                ))
+                
+                self._write_cities_cache(cache_file, source_mtime)
             
-            # Create city-to-state mapping (city_ascii -> state_id)
-            # Use city_ascii for better matching (handles special characters)
-            self.city_to_state = dict(zip(
-                self.cities_df['city_ascii'].str.lower(),
-                self.cities_df['state_id']
-            ))
+            self._build_city_matcher()
             
         except Exception as e:
             logger.error(f"Error loading uscities.csv: {e}")
-            self.cities_df = None
             self.us_states = set()
             self.city_to_state = {}
+            self.city_proper = {}
+    
+    def _read_cities_cache(self, cache_file: Path, source_mtime: int) -> Optional[Dict]:
+        """
+        Read pickled city lookups
+        
+        Args:
+            cache_file: Path to cache file
+            source_mtime: Modification time (ns) of uscities.csv
+            
+        Returns:
+            Cached lookups, or None if missing, unreadable or stale
+        """
+        if not cache_file.exists():
+            return None
+        
+        try:
+            with open(cache_file, 'rb') as f:
+                cache = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read {cache_file.name}: {e}")
+            return None
+        
+        if cache.get('source_mtime') != source_mtime:
+            return None
+        
+        return cache
+    
+    def _write_cities_cache(self, cache_file: Path, source_mtime: int):
+        """
+        Pickle city lookups so later runs (and worker processes) skip the CSV
+        
+        Args:
+            cache_file: Path to cache file
+            source_mtime: Modification time (ns) of uscities.csv
+        """
+        cache = {
+            'source_mtime': source_mtime,
+            'us_states': self.us_states,
+            'city_to_state': self.city_to_state,
+            'city_proper': self.city_proper
+        }
+        
+        try:
+            with open(cache_file, 'wb') as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            logger.warning(f"Could not write {cache_file.name}: {e}")
+    
+    def _build_city_matcher(self):
+        """Build the city name matcher and per-city lookups from city_to_state"""
+        # Build one Aho-Corasick automaton over all city names so each post
+        # is scanned once instead of once per city
+        self._city_names = list(self.city_to_state.keys())
+        if AhoCorasick is not None:
+            self._city_matcher = AhoCorasick(self._city_names, matchkind=MatchKind.LeftmostLongest)
+        else:
+            # Without ahocorasick_rs, compile all names into one regex instead
+            self._city_index = {name: idx for idx, name in enumerate(self._city_names)}
+            self._city_re = re.compile(
+                r'\b' + build_trie_regex(self._city_names) + r'\b',
+                re.IGNORECASE
+            )
+        
+        # Per-city lookups shared by extract_location and extract_city_mentions:
+        # "City, ST" label and position in longest-name-first order
+        self._city_labels = [
+            f"{self.city_proper[name]}, {self.city_to_state[name]}" for name in self._city_names
+        ]
+        longest_first = sorted(range(len(self._city_names)), key=lambda idx: -len(self._city_names[idx]))
+        self._city_rank = [0] * len(self._city_names)
+        for rank, city_idx in enumerate(longest_first):
+            self._city_rank[city_idx] = rank
+    
+    def _find_cities(self, text: str) -> List[int]:
+        """
+        Find whole-word city name matches in text
+        
+        Args:
+            text: Post text
+            
+        Returns:
+            Indexes into self._city_names of the matched cities (in text order)
+        """
+        if AhoCorasick is None:
+            return [self._city_index[m.group(0).lower()] for m in self._city_re.finditer(text)]
+        
+        text_lower = text.lower()
+        matches = []
+        
+        for city_idx, start, end in self._city_matcher.find_matches_as_indexes(text_lower):
+            # Enforce word boundaries (equivalent of \b...\b)
+            if start > 0 and (text_lower[start - 1].isalnum() or text_lower[start - 1] == '_'):
+                continue
+            if end < len(text_lower) and (text_lower[end].isalnum() or text_lower[end] == '_'):
+                continue
+            matches.append(city_idx)
+        
+        return matches
     
     def normalize_text(self, text: str) -> str:
         """
@@ -105,27 +338,10 @@ class RedditPreprocessor:
         if not text or not isinstance(text, str):
             return text
         
-        # Remove null bytes
-        text = text.replace('\x00', '')
-        
-        # Replace smart quotes with regular quotes (before ASCII conversion)
-        text = text.replace('\u201c', '"').replace('\u201d', '"')  # Double quotes
-        text = text.replace('\u2018', "'").replace('\u2019', "'")  # Single quotes
-        text = text.replace('\u2032', "'").replace('\u2033', '"')  # Prime marks
-        
-        # Replace other common Unicode characters
-        text = text.replace('\u2013', '-').replace('\u2014', '--')  # En/em dashes
-        text = text.replace('\u2026', '...')  # Ellipsis
-        text = text.replace('\u00a0', ' ')  # Non-breaking space
-        
-        # Remove all non-ASCII characters (including emojis)
-        # Keep only: letters, numbers, punctuation, spaces, newlines, tabs
-        text = ''.join(char for char in text if ord(char) < 128)
-        
-        # Remove control characters (except newlines and tabs)
-        text = ''.join(char for char in text if ord(char) >= 32 or char in '\n\t')
-        
-        return text
+        # Single pass: replace smart quotes, dashes etc. with ASCII and drop
+        # emojis, other non-ASCII characters, null bytes and control characters
+        # (except newlines and tabs)
+        return text.translate(self._tr)
     
     def extract_price(self, text: str) -> Optional[float]:
         """
@@ -147,16 +363,8 @@ class RedditPreprocessor:
         if not text:
             return None
         
-        # Pattern for prices with K/M suffix
-        # Matches: $450K, $450k, 450K, $1.2M, etc.
-        pattern_km = r'\$?\s*(\d+(?:\.\d+)?)\s*([KkMm])'
-        
-        # Pattern for full prices
-        # Matches: $450,000 or $450000
-        pattern_full = r'\$\s*(\d{1,3}(?:,\d{3})+|\d{5,})'
-        
         # Try K/M format first
-        match = re.search(pattern_km, text)
+        match = self._RE_PRICE_KM.search(text)
         if match:
             amount = float(match.group(1))
             suffix = match.group(2).upper()
@@ -167,7 +375,7 @@ class RedditPreprocessor:
                 return amount * 1000000
         
         # Try full format
-        match = re.search(pattern_full, text)
+        match = self._RE_PRICE_FULL.search(text)
         if match:
             # Remove commas and convert
             amount_str = match.group(1).replace(',', '')
@@ -197,10 +405,8 @@ class RedditPreprocessor:
         if not text:
             return None
         
-        # Pattern for "City, ST" format (most reliable)
-        pattern_city_state = r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*),\s*([A-Z]{2})\b'
-        
-        match = re.search(pattern_city_state, text)
+        # "City, ST" format (most reliable)
+        match = self._RE_CITY_STATE.search(text)
         if match:
             city = match.group(1)
             state = match.group(2)
@@ -211,22 +417,12 @@ class RedditPreprocessor:
         
         # If we have cities data, try to match city names and look up their states
         if self.city_to_state:
-            # Look for city names in the text
-            # Try multi-word cities first (e.g., "San Francisco", "New York")
-            for city_name, state_abbr in self.city_to_state.items():
-                # Create pattern for city name (case-insensitive, word boundaries)
-                # Handle multi-word cities properly
-                city_pattern = r'\b' + re.escape(city_name) + r'\b'
-                if re.search(city_pattern, text, re.IGNORECASE):
-                    # Return properly capitalized city name with state
-                    # Find the actual city name from the dataframe for proper capitalization
-                    if self.cities_df is not None:
-                        city_row = self.cities_df[
-                            self.cities_df['city_ascii'].str.lower() == city_name
-                        ].iloc[0]
-                        return f"{city_row['city_ascii']}, {state_abbr}"
-                    else:
-                        return f"{city_name.title()}, {state_abbr}"
+            # Look for city names in the text (single pass over the text);
+            # if several match, prefer the one listed first in the cities data
+            matches = self._find_cities(text)
+            if matches:
+                # Properly capitalized city name with state
+                return self._city_labels[min(matches)]
         
         return None
     
@@ -247,8 +443,7 @@ class RedditPreprocessor:
         seen_cities = set()  # Track to avoid duplicates
         
         # Check for "City, ST" format first (most reliable)
-        pattern_city_state = r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*),\s*([A-Z]{2})\b'
-        matches = re.finditer(pattern_city_state, text)
+        matches = self._RE_CITY_STATE.finditer(text)
         
         for match in matches:
             city = match.group(1)
@@ -262,96 +457,90 @@ class RedditPreprocessor:
         
         # If we have cities data, look for city names
         if self.city_to_state:
-            # Sort cities by length (longest first) to match multi-word cities first
-            sorted_cities = sorted(self.city_to_state.items(), 
-                                 key=lambda x: len(x[0]), 
-                                 reverse=True)
+            # Leftmost-longest matching picks multi-word cities over names they
+            # contain (e.g. "North Las Vegas" over "Las Vegas"); keep the
+            # longest-name-first output order
+            matches = sorted(set(self._find_cities(text)), key=self._city_rank.__getitem__)
             
-            for city_name, state_abbr in sorted_cities:
-                city_pattern = r'\b' + re.escape(city_name) + r'\b'
-                if re.search(city_pattern, text, re.IGNORECASE):
-                    # Get proper capitalization from dataframe
-                    if self.cities_df is not None:
-                        city_row = self.cities_df[
-                            self.cities_df['city_ascii'].str.lower() == city_name
-                        ].iloc[0]
-                        city_state = f"{city_row['city_ascii']}, {state_abbr}"
-                    else:
-                        city_state = f"{city_name.title()}, {state_abbr}"
-                    
-                    if city_state.lower() not in seen_cities:
-                        cities.append(city_state)
-                        seen_cities.add(city_state.lower())
+            for city_idx in matches:
+                city_state = self._city_labels[city_idx]
+                if city_state.lower() not in seen_cities:
+                    cities.append(city_state)
+                    seen_cities.add(city_state.lower())
         
         return cities
     
-    def process_firsttimehomebuyer_post(self, post: Dict) -> Dict:
+    def process_firsttimehomebuyer_posts(self, full_text: pd.Series) -> Dict[str, pd.Series]:
         """
-        Process a single r/FirstTimeHomeBuyer post
+        Extract metadata from r/FirstTimeHomeBuyer posts
         
         Args:
-            post: Raw post dictionary
+            full_text: Normalized title + selftext of each post
             
         Returns:
-            Processed post dictionary
+            Dictionary of extracted columns
         """
-        # Combine title and selftext for analysis
-        title = self.normalize_text(post.get('title', ''))
-        selftext = self.normalize_text(post.get('selftext', ''))
-        full_text = f"{title}\n\n{selftext}"
-        
-        # Extract metadata
-        location = self.extract_location(full_text)
-        purchase_price = self.extract_price(full_text)
-        
         return {
-            'post_id': post.get('id'),
-            'subreddit': 'FirstTimeHomeBuyer',
-            'created_utc': post.get('created_utc'),
-            'created_date': datetime.fromtimestamp(post.get('created_utc', 0)).strftime('%Y-%m-%d'),
-            'title': title,
-            'selftext': selftext,
-            'score': post.get('score', 0),
-            'num_comments': post.get('num_comments', 0),
-            'author': post.get('author', '[deleted]'),
-            'location': location,
-            'purchase_price': purchase_price,
+            'location': full_text.map(self.extract_location),
+            'purchase_price': full_text.map(self.extract_price),
             'city_mentions': None,  # Not used for this subreddit
-            'permalink': f"https://reddit.com{post.get('permalink', '')}"
         }
     
-    def process_samegrassbutgreener_post(self, post: Dict) -> Dict:
+    def process_samegrassbutgreener_posts(self, full_text: pd.Series) -> Dict[str, pd.Series]:
         """
-        Process a single r/SameGrassButGreener post
+        Extract city mentions from r/SameGrassButGreener posts
         
         Args:
-            post: Raw post dictionary
+            full_text: Normalized title + selftext of each post
             
         Returns:
-            Processed post dictionary
+            Dictionary of extracted columns
         """
-        # Combine title and selftext for analysis
-        title = self.normalize_text(post.get('title', ''))
-        selftext = self.normalize_text(post.get('selftext', ''))
-        full_text = f"{title}\n\n{selftext}"
-        
-        # Extract city mentions
-        city_mentions = self.extract_city_mentions(full_text)
+        city_mentions = full_text.map(self.extract_city_mentions)
         
         return {
-            'post_id': post.get('id'),
-            'subreddit': 'SameGrassButGreener',
-            'created_utc': post.get('created_utc'),
-            'created_date': datetime.fromtimestamp(post.get('created_utc', 0)).strftime('%Y-%m-%d'),
-            'title': title,
-            'selftext': selftext,
-            'score': post.get('score', 0),
-            'num_comments': post.get('num_comments', 0),
-            'author': post.get('author', '[deleted]'),
             'location': None,  # Not used for this subreddit
             'purchase_price': None,  # Not used for this subreddit
-            'city_mentions': '|'.join(city_mentions) if city_mentions else None,  # Pipe-separated
-            'permalink': f"https://reddit.com{post.get('permalink', '')}"
+            'city_mentions': city_mentions.map(lambda cities: '|'.join(cities) if cities else None),  # Pipe-separated
+        }
+    
+    def extract_fields(self, subreddit: str, full_text: pd.Series) -> Dict[str, pd.Series]:
+        """
+        Extract subreddit-specific metadata, in parallel for large subreddits
+        
+        Posts are split into chunks of CHUNK_SIZE and processed by worker
+        processes (one per CPU), each with its own preprocessor instance.
+        
+        Args:
+            subreddit: Subreddit name (key of SUBREDDIT_EXTRACTORS)
+            full_text: Normalized title + selftext of each post
+            
+        Returns:
+            Dictionary of extracted columns
+        """
+        extract = getattr(self, self.SUBREDDIT_EXTRACTORS[subreddit])
+        max_workers = os.cpu_count() or 1
+        
+        if len(full_text) <= self.CHUNK_SIZE or max_workers == 1:
+            return extract(full_text)
+        
+        chunks = [
+            full_text.iloc[start:start + self.CHUNK_SIZE]
+            for start in range(0, len(full_text), self.CHUNK_SIZE)
+        ]
+        logger.info(f"Extracting metadata from {len(chunks)} chunks with {max_workers} workers...")
+        
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(str(self.raw_dir), str(self.processed_dir))
+        ) as executor:
+            results = list(executor.map(_extract_chunk, [subreddit] * len(chunks), chunks))
+        
+        # Stitch chunk columns back together (None marks unused columns)
+        return {
+            column: pd.concat([result[column] for result in results]) if value is not None else None
+            for column, value in results[0].items()
         }
     
     def process_subreddit(self, subreddit: str) -> pd.DataFrame:
@@ -375,33 +564,49 @@ class RedditPreprocessor:
             logger.warning(f"No data file found: {posts_file}")
             return pd.DataFrame()
         
-        with open(posts_file, 'r', encoding='utf-8') as f:
-            raw_posts = json.load(f)
+        raw_posts = orjson.loads(posts_file.read_bytes())
         
         logger.info(f"Loaded {len(raw_posts)} raw posts")
         
-        # Process each post
-        processed_posts = []
+        # Extraction depends on subreddit
+        if subreddit not in self.SUBREDDIT_EXTRACTORS:
+            logger.warning(f"No processing defined for r/{subreddit}")
+            return pd.DataFrame()
         
-        for post in raw_posts:
-            # Skip deleted/removed posts
-            if post.get('selftext') in ['[deleted]', '[removed]']:
-                continue
-            
-            # Process based on subreddit
-            if subreddit == 'FirstTimeHomeBuyer':
-                processed = self.process_firsttimehomebuyer_post(post)
-            elif subreddit == 'SameGrassButGreener':
-                processed = self.process_samegrassbutgreener_post(post)
-            else:
-                continue
-            
-            processed_posts.append(processed)
+        # Build columns directly from the raw posts, keeping only the fields we use
+        # (skips pandas' per-record dict-to-row conversion)
+        posts = pd.DataFrame({
+            field: [post.get(field) for post in raw_posts]
+            for field in self.RAW_POST_FIELDS
+        })
         
-        logger.info(f"Processed {len(processed_posts)} posts")
+        # Skip deleted/removed posts
+        posts = posts[~posts['selftext'].isin(['[deleted]', '[removed]'])]
         
-        # Create DataFrame
-        df = pd.DataFrame(processed_posts)
+        if posts.empty:
+            logger.info("No posts to process")
+            return pd.DataFrame()
+        
+        # Normalize text for all posts at once and combine title and selftext for analysis
+        title = posts['title'].fillna('').str.translate(self._tr)
+        selftext = posts['selftext'].fillna('').str.translate(self._tr)
+        full_text = title + '\n\n' + selftext
+        
+        df = pd.DataFrame({
+            'post_id': posts['id'],
+            'subreddit': subreddit,
+            'created_utc': posts['created_utc'],
+            'created_date': pd.to_datetime(posts['created_utc'].fillna(0), unit='s').dt.strftime('%Y-%m-%d'),
+            'title': title,
+            'selftext': selftext,
+            'score': posts['score'].fillna(0).astype('int64'),
+            'num_comments': posts['num_comments'].fillna(0).astype('int64'),
+            'author': posts['author'].fillna('[deleted]'),
+            **self.extract_fields(subreddit, full_text),
+            'permalink': 'https://reddit.com' + posts['permalink'].fillna(''),
+        }).reset_index(drop=True)
+        
+        logger.info(f"Processed {len(df)} posts")
         
         # Log extraction stats
         if subreddit == 'FirstTimeHomeBuyer':
@@ -447,16 +652,20 @@ class RedditPreprocessor:
         combined_df = combined_df.sort_values('created_utc')
         
         # Save to CSV with RFC 4180 standard quoting for BigQuery compatibility
-        # Use doublequote (quotes within quotes are escaped as "") instead of backslash
+        # PyArrow's C++ writer quotes all non-null fields, escapes quotes within
+        # quotes by doubling them ("") and uses Unix line endings
+        # Rows are converted and written in chunks to bound peak memory
         output_file = self.processed_dir / 'reddit_posts.csv'
-        combined_df.to_csv(
-            output_file, 
-            index=False, 
-            encoding='utf-8',
-            quoting=1,  # QUOTE_ALL - quote all fields
-            doublequote=True,  # Escape quotes by doubling them ("")
-            lineterminator='\n'  # Use Unix line endings for consistency
-        )
+        schema = pa.Schema.from_pandas(combined_df, preserve_index=False)
+        
+        with pacsv.CSVWriter(
+            output_file,
+            schema,
+            write_options=pacsv.WriteOptions(quoting_style='all_valid')
+        ) as writer:
+            for start in range(0, len(combined_df), self.CSV_CHUNK_SIZE):
+                chunk = combined_df.iloc[start:start + self.CSV_CHUNK_SIZE]
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
         
         logger.info(f"\n✅ Preprocessing complete!")
         logger.info(f"Total posts: {len(combined_df)}")
@@ -465,6 +674,22 @@ class RedditPreprocessor:
         return combined_df
 
 
+# Preprocessor instance of each worker process (see RedditPreprocessor.extract_fields)
+_worker_preprocessor = None
+
+
+def _init_worker(raw_dir: str, processed_dir: str):
+    """Create the worker's preprocessor (the city matcher can't be pickled)"""
+    global _worker_preprocessor
+    _worker_preprocessor = RedditPreprocessor(raw_dir=raw_dir, processed_dir=processed_dir)
+
+
+def _extract_chunk(subreddit: str, full_text: pd.Series) -> Dict[str, pd.Series]:
+    """Extract metadata for one chunk of posts in a worker process"""
+    extract = getattr(_worker_preprocessor, RedditPreprocessor.SUBREDDIT_EXTRACTORS[subreddit])
+    return extract(full_text)
+
+
 def main():
     """Main execution function"""
     # Define paths
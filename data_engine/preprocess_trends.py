@@ -5,6 +5,8 @@ Transforms raw Google Trends CSV data into normalized format for BigQuery.
 """
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from pathlib import Path
 from typing import Dict, List
 import logging
@@ -69,8 +71,8 @@ class TrendsPreprocessor:
             logger.warning(f"No data file found: {data_file}")
             return pd.DataFrame()
         
-        # Load data
-        df = pd.read_csv(data_file, parse_dates=['date'])
+        # Load data (PyArrow's multithreaded CSV parser)
+        df = pd.read_csv(data_file, parse_dates=['date'], engine='pyarrow')
         
         # Load metadata
         with open(metadata_file, 'r', encoding='utf-8') as f:
@@ -134,38 +136,23 @@ class TrendsPreprocessor:
         # Aggregate to weekly level to reduce noise
         logger.info("Aggregating to weekly level...")
         
-        # Group by week and search_term, calculate average interest score
-        weekly_dfs = []
-        for term in combined_df['search_term'].unique():
-            term_df = combined_df[combined_df['search_term'] == term].copy()
-            
-            # Set date as index for resampling
-            term_df = term_df.set_index('date')
-            
-            # Resample to weekly (Sunday start), taking mean of interest_score
-            # label='left' makes week_start_date the actual Sunday the week starts, not the end boundary
-            weekly = term_df.resample('W-SUN', label='left').agg({
-                'interest_score': 'mean',
-                'category': 'first',  # Category is constant per term
-                'region': 'first'     # Region is constant
-            }).reset_index()
-            
-            # Rename columns for clarity
-            weekly = weekly.rename(columns={
-                'date': 'week_start_date',
-                'interest_score': 'avg_interest_score'
-            })
-            
-            # Round average to integer
-            weekly['avg_interest_score'] = weekly['avg_interest_score'].round().astype(int)
-            
-            # Add search term back
-            weekly['search_term'] = term
-            
-            weekly_dfs.append(weekly)
-        
-        # Combine all weekly data
-        combined_df = pd.concat(weekly_dfs, ignore_index=True)
+        # Resample every term to weekly (Sunday start) in one grouped pass,
+        # taking mean of interest_score (category and region are constant per term)
+        # label='left' makes week_start_date the actual Sunday the week starts, not the end boundary
+        weekly = (
+            combined_df.set_index('date')
+            .groupby(['search_term', 'category', 'region'])['interest_score']
+            .resample('W-SUN', label='left')
+            .mean()
+        )
+        
+        # Round average to integer and rename columns for clarity
+        combined_df = (
+            weekly.round().astype(int)
+            .rename('avg_interest_score')
+            .reset_index()
+            .rename(columns={'date': 'week_start_date'})
+        )
         
         # Sort by date and term
         combined_df = combined_df.sort_values(['week_start_date', 'search_term'])
@@ -173,9 +160,15 @@ class TrendsPreprocessor:
         # Reorder columns
         combined_df = combined_df[['week_start_date', 'search_term', 'category', 'avg_interest_score', 'region']]
         
-        # Save to CSV
+        # Save to CSV (PyArrow's C++ writer; week_start_date written as YYYY-MM-DD)
         output_file = self.processed_dir / 'trends_data.csv'
-        combined_df.to_csv(output_file, index=False)
+        table = pa.Table.from_pandas(combined_df, preserve_index=False)
+        table = table.set_column(
+            table.schema.get_field_index('week_start_date'),
+            'week_start_date',
+            table['week_start_date'].cast(pa.date32())
+        )
+        pacsv.write_csv(table, output_file)
         
         logger.info(f"\n{'='*60}")
         logger.info("✅ Preprocessing complete!")
@@ -10,9 +10,18 @@ Output: Parquet files in zillow_processed/ with normalized schema
 
 import pandas as pd
 import numpy as np
+import csv
+import re
+from pandas.api.types import union_categoricals
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from pathlib import Path
+from typing import List
 from datetime import datetime
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 
 # Configure logging
 logging.basicConfig(
@@ -22,6 +31,29 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def fast_concat(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate frames with identical columns column by column
+    
+    Categorical columns are combined with union_categoricals and all other
+    columns with np.concatenate, bypassing pd.concat's block manager.
+    
+    Args:
+        frames: DataFrames with the same columns and dtypes
+        
+    Returns:
+        Concatenated DataFrame with a fresh RangeIndex
+    """
+    columns = {}
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            columns[col] = union_categoricals([df[col] for df in frames])
+        else:
+            columns[col] = np.concatenate([df[col].to_numpy() for df in frames])
+    
+    return pd.DataFrame(columns, copy=False)
+
+
 class ZillowPreprocessor:
     """Handles transformation of Zillow raw data to normalized format"""
     
@@ -41,6 +73,30 @@ class ZillowPreprocessor:
     # Metadata columns (not date columns)
     METADATA_COLS = ['RegionID', 'SizeRank', 'RegionName', 'RegionType', 'StateName']
     
+    # Compact Arrow types for metadata (low-cardinality strings are
+    # dictionary-encoded, which pandas receives as categoricals)
+    METADATA_TYPES = {
+        'RegionID': pa.int32(),
+        'SizeRank': pa.int32(),
+        'RegionName': pa.dictionary(pa.int32(), pa.string()),
+        'RegionType': pa.dictionary(pa.int32(), pa.string()),
+        'StateName': pa.dictionary(pa.int32(), pa.string())
+    }
+    
+    # Metadata columns kept in the output, mapped to BigQuery column names
+    OUTPUT_COLUMN_NAMES = {
+        'RegionID': 'region_id',
+        'RegionName': 'region_name',
+        'RegionType': 'region_type',
+        'StateName': 'state_name'
+    }
+    
+    # Bytes of CSV parsed per streamed record batch
+    CSV_BLOCK_SIZE = 8 << 20
+    
+    # Header pattern for the monthly value columns
+    DATE_COLUMN_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+    
     def __init__(self, raw_dir: str, processed_dir: str):
         """
         Initialize preprocessor
@@ -67,60 +123,52 @@ class ZillowPreprocessor:
         """
         logger.info(f"Processing {filename}...")
         
-        # Read CSV
+        # Read just the header to find the date columns, so extra columns
+        # are skipped and every column's type is pinned up front
         filepath = self.raw_dir / filename
-        df = pd.read_csv(filepath)
-        
-        logger.info(f"  Loaded {len(df)} regions with {len(df.columns)} columns")
+        with open(filepath, newline='') as f:
+            header = next(csv.reader(f))
+        date_cols = [col for col in header if self.DATE_COLUMN_PATTERN.match(col)]
         
         # Get metric type from filename
         metric_type = self.METRIC_MAPPING.get(filename)
         if not metric_type:
             raise ValueError(f"Unknown file: {filename}")
         
-        # Identify date columns (all columns except metadata)
-        date_cols = [col for col in df.columns if col not in self.METADATA_COLS]
-        
         logger.info(f"  Found {len(date_cols)} date columns from {date_cols[0]} to {date_cols[-1]}")
         
-        # Transform from wide to long format
-        df_long = pd.melt(
-            df,
-            id_vars=self.METADATA_COLS,
-            value_vars=date_cols,
-            var_name='date',
-            value_name='value'
-        )
-        
-        # Add metric type column
-        df_long['metric_type'] = metric_type
-        
-        # Convert date strings to datetime
-        df_long['date'] = pd.to_datetime(df_long['date'])
-        
-        # Clean column names (lowercase, snake_case)
-        df_long.columns = [col.lower().replace(' ', '_') for col in df_long.columns]
-        
-        # Rename columns to match BigQuery schema
-        df_long = df_long.rename(columns={
-            'regionid': 'region_id',
-            'sizerank': 'size_rank',
-            'regionname': 'region_name',
-            'regiontype': 'region_type',
-            'statename': 'state_name'
-        })
+        # Parse each date header once for all chunks
+        dates = pd.to_datetime(date_cols, format='%Y-%m-%d').to_numpy()
+        
+        # Stream the CSV in record batches with PyArrow's C++ parser and
+        # reshape each batch on its own, so only one wide chunk is held at once
+        column_types = dict(self.METADATA_TYPES)
+        column_types.update({col: pa.float64() for col in date_cols})
+        chunks = []
+        n_regions = 0
+        # Memory-map the file so the parser reads pages without extra copies
+        with pa.memory_map(str(filepath), 'r') as source:
+            reader = pacsv.open_csv(
+                source,
+                read_options=pacsv.ReadOptions(use_threads=True, block_size=self.CSV_BLOCK_SIZE),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=self.METADATA_COLS + date_cols,
+                    column_types=column_types,
+                    strings_can_be_null=True
+                )
+            )
+            
+            for batch in reader:
+                df = batch.to_pandas()
+                n_regions += len(df)
+                chunks.append(self._reshape_chunk(df, date_cols, dates, metric_type))
         
-        # Reorder columns
-        df_long = df_long[[
-            'region_id', 'region_name', 'region_type', 'state_name',
-            'metric_type', 'date', 'value'
-        ]]
+        logger.info(f"  Loaded {n_regions} regions with {len(self.METADATA_COLS) + len(date_cols)} columns")
         
-        # Remove rows with null values
-        initial_rows = len(df_long)
-        df_long = df_long.dropna(subset=['value'])
-        removed_rows = initial_rows - len(df_long)
+        df_long = fast_concat(chunks) if len(chunks) > 1 else chunks[0]
         
+        # Report rows skipped for null values
+        removed_rows = n_regions * len(date_cols) - len(df_long)
         if removed_rows > 0:
             logger.info(f"  Removed {removed_rows:,} rows with null values")
         
@@ -128,6 +176,72 @@ class ZillowPreprocessor:
         
         return df_long
     
+    def _reshape_chunk(
+        self,
+        df: pd.DataFrame,
+        date_cols: List[str],
+        dates: np.ndarray,
+        metric_type: str
+    ) -> pd.DataFrame:
+        """
+        Reshape a chunk of wide-format regions to long format
+        
+        Args:
+            df: Wide-format chunk (metadata plus one column per date)
+            date_cols: Names of the date columns
+            dates: Parsed dates matching date_cols
+            metric_type: Metric name for every row of the chunk
+            
+        Returns:
+            Long-format chunk with normalized schema
+        """
+        # Transform from wide to long format directly with NumPy (same row
+        # order as pd.melt: every region for the first date, then the next...)
+        # Null cells are masked out up front so no long-format row is built
+        # only to be dropped later
+        values = df[date_cols].to_numpy(dtype=np.float64).ravel(order='F')
+        
+        # Flat positions of the non-null cells map back to (date, region)
+        # pairs, so every output column is gathered once at its final size
+        positions = np.flatnonzero(~np.isnan(values))
+        date_idx, region_idx = np.divmod(positions, len(df))
+        
+        # Gather the metadata (categoricals as codes) so the long frame never
+        # holds millions of duplicated Python strings; columns are built
+        # directly under their BigQuery names and in schema order
+        columns = {
+            output_col: self._take(df[col], region_idx)
+            for col, output_col in self.OUTPUT_COLUMN_NAMES.items()
+        }
+        columns['metric_type'] = pd.Categorical.from_codes(
+            np.zeros(len(positions), dtype=np.int8), categories=[metric_type]
+        )
+        columns['date'] = dates[date_idx]
+        columns['value'] = values[positions]
+        
+        return pd.DataFrame(columns, copy=False)
+    
+    @staticmethod
+    def _take(column: pd.Series, indices: np.ndarray):
+        """
+        Gather rows of a column by position
+        
+        Categoricals are gathered as codes rather than materialised strings.
+        
+        Args:
+            column: Column to gather from
+            indices: Row positions to take
+            
+        Returns:
+            Gathered Categorical or NumPy array
+        """
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            return pd.Categorical.from_codes(
+                column.cat.codes.to_numpy()[indices],
+                dtype=column.dtype
+            )
+        return column.to_numpy()[indices]
+    
     def process_all(self, save_format: str = 'parquet') -> pd.DataFrame:
         """
         Process all Zillow CSV files and combine into single dataset
@@ -142,36 +256,60 @@ class ZillowPreprocessor:
         logger.info(f"Raw data directory: {self.raw_dir}")
         logger.info(f"Processed data directory: {self.processed_dir}")
         
+        if save_format not in ('parquet', 'csv'):
+            raise ValueError(f"Unsupported format: {save_format}")
+        
+        output_filename = f"zillow_combined.{save_format}"
+        output_path = self.processed_dir / output_filename
+        
         all_data = []
         
-        # Process each file
-        for filename in self.METRIC_MAPPING.keys():
-            try:
-                df = self.process_file(filename)
-                all_data.append(df)
-            except Exception as e:
-                logger.error(f"Error processing {filename}: {e}")
-                raise
+        # Files are independent, so parse and reshape them in parallel worker
+        # processes (results are collected in METRIC_MAPPING order)
+        max_workers = min(len(self.METRIC_MAPPING), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                filename: executor.submit(self.process_file, filename)
+                for filename in self.METRIC_MAPPING.keys()
+            }
+            
+            for filename, future in futures.items():
+                try:
+                    df = future.result()
+                    all_data.append(df)
+                except Exception as e:
+                    logger.error(f"Error processing {filename}: {e}")
+                    raise
+        
+        # Align categories across files so concat keeps the categorical dtypes
+        # instead of falling back to object
+        for col in all_data[0].select_dtypes('category').columns:
+            categories = union_categoricals(
+                [pd.Categorical(df[col].cat.categories) for df in all_data],
+                sort_categories=True
+            ).categories
+            for df in all_data:
+                df[col] = df[col].cat.set_categories(categories)
+        
+        # Stream each metric into the parquet file as its own row groups, so
+        # the writer never needs an Arrow copy of the combined table
+        if save_format == 'parquet':
+            self._write_parquet(all_data, output_path)
         
-        # Combine all dataframes
+        # Combine all dataframes (a single frame needs no concat at all)
         logger.info("Combining all metrics...")
-        combined_df = pd.concat(all_data, ignore_index=True)
+        if len(all_data) > 1:
+            combined_df = fast_concat(all_data)
+        else:
+            combined_df = all_data[0].reset_index(drop=True)
         
         logger.info(f"Total rows: {len(combined_df):,}")
         logger.info(f"Date range: {combined_df['date'].min()} to {combined_df['date'].max()}")
         logger.info(f"Unique regions: {combined_df['region_id'].nunique():,}")
         logger.info(f"Metrics: {combined_df['metric_type'].unique().tolist()}")
         
-        # Save to file
-        output_filename = f"zillow_combined.{save_format}"
-        output_path = self.processed_dir / output_filename
-        
-        if save_format == 'parquet':
-            combined_df.to_parquet(output_path, index=False, compression='snappy')
-        elif save_format == 'csv':
+        if save_format == 'csv':
             combined_df.to_csv(output_path, index=False)
-        else:
-            raise ValueError(f"Unsupported format: {save_format}")
         
         logger.info(f"Saved to {output_path}")
         
@@ -182,21 +320,53 @@ class ZillowPreprocessor:
         # Print data quality summary
         logger.info("\nData Quality Summary:")
         logger.info(f"  Total rows: {len(combined_df):,}")
-        logger.info(f"  Null values: {combined_df.isnull().sum().sum()}")
-        logger.info(f"  Duplicate rows: {combined_df.duplicated().sum()}")
+        # Only state_name (national rows) and value can hold nulls; the other
+        # columns are non-null by construction
+        null_count = int(combined_df['state_name'].isna().sum() + combined_df['value'].isna().sum())
+        logger.info(f"  Null values: {null_count}")
+        
+        # Hashing every row is expensive, so only check duplicates when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"  Duplicate rows: {combined_df.duplicated().sum()}")
         
         # Print value statistics by metric
         logger.info("\nValue statistics by metric:")
-        for metric in combined_df['metric_type'].unique():
-            metric_data = combined_df[combined_df['metric_type'] == metric]['value']
+        stats = combined_df.groupby('metric_type', observed=True, sort=False)['value'].agg(
+            ['count', 'mean', 'min', 'max']
+        )
+        for metric, row in stats.iterrows():
             logger.info(f"  {metric}:")
-            logger.info(f"    Count: {len(metric_data):,}")
-            logger.info(f"    Mean: ${metric_data.mean():,.2f}")
-            logger.info(f"    Min: ${metric_data.min():,.2f}")
-            logger.info(f"    Max: ${metric_data.max():,.2f}")
+            logger.info(f"    Count: {int(row['count']):,}")
+            logger.info(f"    Mean: ${row['mean']:,.2f}")
+            logger.info(f"    Min: ${row['min']:,.2f}")
+            logger.info(f"    Max: ${row['max']:,.2f}")
         
         return combined_df
     
+    @staticmethod
+    def _write_parquet(frames: List[pd.DataFrame], output_path: Path) -> None:
+        """
+        Write long-format frames to one parquet file, one frame at a time
+        
+        Args:
+            frames: Long-format DataFrames sharing the same dtypes
+            output_path: Destination parquet file
+        """
+        schema = pa.Schema.from_pandas(frames[0], preserve_index=False)
+        
+        # Dictionary-encoded, ZSTD-compressed, large row groups
+        with pq.ParquetWriter(
+            output_path,
+            schema,
+            compression='zstd',
+            compression_level=3,
+            use_dictionary=True,
+            data_page_size=1 << 20
+        ) as writer:
+            for df in frames:
+                table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+                writer.write_table(table, row_group_size=1_000_000)
+    
     def create_city_latest_table(self, df_long: pd.DataFrame) -> pd.DataFrame:
         """
         Create table with latest metric values for each city
@@ -209,24 +379,27 @@ class ZillowPreprocessor:
         """
         logger.info("Creating city latest table...")
         
-        # Sort by date and get latest for each city-metric combination
-        df_sorted = df_long.sort_values('date')
-        df_latest = df_sorted.groupby(
-            ['region_name', 'state_name', 'metric_type', 'region_type']
-        ).last().reset_index()
+        # Pick the latest row for each city-metric combination in one pass
+        # (no global sort of the long frame)
+        latest_idx = df_long.groupby(
+            ['region_name', 'state_name', 'metric_type', 'region_type'],
+            observed=True, sort=False
+        )['date'].idxmax()
+        df_latest = df_long.loc[latest_idx].reset_index(drop=True)
         
         logger.info(f"  Found {len(df_latest)} city-metric combinations")
         
-        # Pivot to wide format (one row per city, columns for each metric)
-        df_pivot = df_latest.pivot_table(
-            index=['region_name', 'state_name', 'region_type'],
-            columns='metric_type',
-            values='value',
-            aggfunc='first'
-        ).reset_index()
+        # Pivot to wide format (one row per city, columns for each metric);
+        # rows are already unique per city-metric, so a plain unstack suffices
+        # (sorted to keep pivot_table's city ordering)
+        df_pivot = df_latest.set_index(
+            ['region_name', 'state_name', 'region_type', 'metric_type']
+        )['value'].unstack('metric_type').sort_index().reset_index()
         
         # Add latest_date column (max date across all metrics for each city)
-        latest_dates = df_latest.groupby(['region_name', 'state_name'])['date'].max().reset_index()
+        latest_dates = df_latest.groupby(
+            ['region_name', 'state_name'], observed=True, sort=False
+        )['date'].max().reset_index()
         df_pivot = df_pivot.merge(latest_dates, on=['region_name', 'state_name'])
         
         logger.info(f"  Created table with {len(df_pivot)} cities and {len(df_pivot.columns)} columns")
@@ -245,8 +418,8 @@ class ZillowPreprocessor:
         """
         logger.info("Creating state aggregated table...")
         
-        # Filter to MSA (city-level) only
-        df_msa = df_city_latest[df_city_latest['region_type'] == 'msa'].copy()
+        # Filter to MSA (city-level) only; the slice is only read, so no copy
+        df_msa = df_city_latest[df_city_latest['region_type'] == 'msa']
         
         # Define which metrics to sum vs average
         sum_metrics = [
@@ -268,8 +441,9 @@ class ZillowPreprocessor:
             elif col not in ['region_type', 'date']:
                 agg_dict[col] = 'mean'
         
-        # Perform aggregation
-        df_state = df_msa.groupby('state_name').agg(agg_dict).reset_index()
+        # Perform aggregation (only observed states; the handful of groups
+        # stays sorted so the table is ordered by state)
+        df_state = df_msa.groupby('state_name', observed=True).agg(agg_dict).reset_index()
         df_state.rename(columns={'region_name': 'city_count'}, inplace=True)
         
         logger.info(f"  Created table with {len(df_state)} states and {len(df_state.columns)} columns")
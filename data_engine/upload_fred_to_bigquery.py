@@ -7,6 +7,10 @@ partitioning, and clustering configuration.
 
 from google.cloud import bigquery
 from pathlib import Path
+import gzip
+import shutil
+import tempfile
+from typing import Dict
 import logging
 import os
 from dotenv import load_dotenv
@@ -22,9 +26,42 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def gzip_csv(csv_file: Path, output_dir: Path) -> Path:
+    """
+    Gzip a CSV into a scratch directory for upload
+    
+    Args:
+        csv_file: Path to the CSV file
+        output_dir: Directory to write the archive to (e.g. a temp dir)
+        
+    Returns:
+        Path to the .csv.gz file
+    """
+    csv_gz = Path(output_dir) / f"{csv_file.name}.gz"
+    
+    with open(csv_file, 'rb') as src, gzip.open(csv_gz, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    logger.info(f"Compressed {csv_file.name} to {csv_gz}")
+    
+    return csv_gz
+
+
 class FREDBigQueryUploader:
     """Handles uploading FRED data to BigQuery"""
     
+    # Table layout, shared by table creation and load jobs
+    SCHEMA = [
+        bigquery.SchemaField("series_id", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("series_name", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
+        bigquery.SchemaField("value", "FLOAT", mode="REQUIRED"),
+        bigquery.SchemaField("frequency", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("units", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("last_updated", "TIMESTAMP", mode="REQUIRED"),
+    ]
+    CLUSTERING_FIELDS = ["series_id", "date"]
+    DESCRIPTION = "Federal Reserve Economic Data (FRED) time series metrics"
+    
     def __init__(self, project_id: str, dataset_id: str):
         """
         Initialize BigQuery uploader
@@ -37,6 +74,17 @@ class FREDBigQueryUploader:
         self.dataset_id = dataset_id
         self.client = bigquery.Client(project=project_id)
         
+        # Table objects already fetched or created this run, keyed by table ID
+        self._table_cache: Dict[str, bigquery.Table] = {}
+        
+    @staticmethod
+    def _time_partitioning() -> bigquery.TimePartitioning:
+        """Monthly partitioning on the date column"""
+        return bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.MONTH,
+            field="date"
+        )
+    
     def create_fred_table(self, table_id: str) -> bigquery.Table:
         """
         Create BigQuery table for FRED data with proper schema
@@ -47,32 +95,21 @@ class FREDBigQueryUploader:
         Returns:
             Created table object
         """
-        # Define schema
-        schema = [
-            bigquery.SchemaField("series_id", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("series_name", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
-            bigquery.SchemaField("value", "FLOAT", mode="REQUIRED"),
-            bigquery.SchemaField("frequency", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("units", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("last_updated", "TIMESTAMP", mode="REQUIRED"),
-        ]
+        if table_id in self._table_cache:
+            return self._table_cache[table_id]
         
         # Create table reference
         table_ref = f"{self.project_id}.{self.dataset_id}.{table_id}"
-        table = bigquery.Table(table_ref, schema=schema)
+        table = bigquery.Table(table_ref, schema=self.SCHEMA)
         
         # Configure partitioning (by date, monthly)
-        table.time_partitioning = bigquery.TimePartitioning(
-            type_=bigquery.TimePartitioningType.MONTH,
-            field="date"
-        )
+        table.time_partitioning = self._time_partitioning()
         
         # Configure clustering
-        table.clustering_fields = ["series_id", "date"]
+        table.clustering_fields = self.CLUSTERING_FIELDS
         
         # Set table description
-        table.description = "Federal Reserve Economic Data (FRED) time series metrics"
+        table.description = self.DESCRIPTION
         
         # Set labels
         table.labels = {
@@ -91,6 +128,7 @@ class FREDBigQueryUploader:
             else:
                 raise
         
+        self._table_cache[table_id] = table
         return table
     
     def upload_from_parquet(
@@ -109,25 +147,24 @@ class FREDBigQueryUploader:
         """
         logger.info(f"Uploading {parquet_file} to {table_id}...")
         
-        # Create table if it doesn't exist
-        table = self.create_fred_table(table_id)
-        
         # Configure load job
         job_config = bigquery.LoadJobConfig(
             source_format=bigquery.SourceFormat.PARQUET,
             write_disposition=write_disposition,
             # Use explicit schema to ensure all data is loaded
-            schema=[
-                bigquery.SchemaField("series_id", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("series_name", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
-                bigquery.SchemaField("value", "FLOAT", mode="REQUIRED"),
-                bigquery.SchemaField("frequency", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("units", "STRING", mode="REQUIRED"),
-                bigquery.SchemaField("last_updated", "TIMESTAMP", mode="REQUIRED"),
-            ]
+            schema=self.SCHEMA
         )
         
+        if write_disposition == "WRITE_TRUNCATE":
+            # The load job creates or replaces the table with the full layout
+            # itself, so no separate create/get round trip is needed
+            job_config.time_partitioning = self._time_partitioning()
+            job_config.clustering_fields = self.CLUSTERING_FIELDS
+            job_config.destination_table_description = self.DESCRIPTION
+        else:
+            # Create table if it doesn't exist
+            self.create_fred_table(table_id)
+        
         # Load data
         table_ref = f"{self.project_id}.{self.dataset_id}.{table_id}"
         
@@ -142,14 +179,13 @@ class FREDBigQueryUploader:
         logger.info("Waiting for upload to complete...")
         job.result()
         
-        # Get table info
-        table = self.client.get_table(table_ref)
+        # Report from the job statistics instead of re-fetching the table
         logger.info(f"✅ Upload complete!")
         logger.info(f"  Table: {table_ref}")
-        logger.info(f"  Rows: {table.num_rows:,}")
-        logger.info(f"  Size: {table.num_bytes / (1024**2):.2f} MB")
+        logger.info(f"  Rows loaded: {job.output_rows:,}")
+        logger.info(f"  Size loaded: {job.output_bytes / (1024**2):.2f} MB")
         
-        return table
+        return job.destination
     
     def upload_from_csv(
         self, 
@@ -167,15 +203,17 @@ class FREDBigQueryUploader:
         """
         logger.info(f"Uploading {csv_file} to {table_id}...")
         
-        # Don't pre-create table - let autodetect handle it
-        # Pre-creating with partitioning/clustering conflicts with autodetect
-        
-        # Configure load job with autodetect
+        # Configure load job with the known schema and table layout, so
+        # BigQuery skips the autodetect sampling pass and creates the table
+        # partitioned and clustered if it doesn't exist yet
         job_config = bigquery.LoadJobConfig(
             source_format=bigquery.SourceFormat.CSV,
             write_disposition=write_disposition,
             skip_leading_rows=1,  # Skip header row
-            autodetect=True,  # Let BigQuery detect schema from data
+            schema=self.SCHEMA,
+            time_partitioning=self._time_partitioning(),
+            clustering_fields=self.CLUSTERING_FIELDS,
+            destination_table_description=self.DESCRIPTION,
         )
         
         # Load data
@@ -230,59 +268,39 @@ class FREDBigQueryUploader:
         ORDER BY series_id
         """
         
-        logger.info("\n📊 Observations by series:")
-        results = self.client.query(query1).result()
-        for row in results:
-            logger.info(f"\n  {row.series_id} ({row.frequency}):")
-            logger.info(f"    Name: {row.series_name}")
-            logger.info(f"    Observations: {row.observation_count:,}")
-            logger.info(f"    Date range: {row.earliest_date} to {row.latest_date}")
-            logger.info(f"    Value range: {row.min_value} to {row.max_value}")
-        
         # Query 2: Latest values for each series
+        # (top-1 per series via ARRAY_AGG, no full sort of each partition)
         query2 = f"""
-        WITH latest_obs AS (
+        SELECT 
+            series_id,
+            latest.series_name,
+            latest.date as latest_date,
+            ROUND(latest.value, 2) as latest_value,
+            latest.units
+        FROM (
             SELECT 
                 series_id,
-                series_name,
-                date,
-                value,
-                units,
-                ROW_NUMBER() OVER (PARTITION BY series_id ORDER BY date DESC) as rn
+                ARRAY_AGG(
+                    STRUCT(series_name, date, value, units)
+                    ORDER BY date DESC LIMIT 1
+                )[OFFSET(0)] as latest
             FROM `{table_ref}`
+            GROUP BY series_id
         )
-        SELECT 
-            series_id,
-            series_name,
-            date as latest_date,
-            ROUND(value, 2) as latest_value,
-            units
-        FROM latest_obs
-        WHERE rn = 1
         ORDER BY series_id
         """
         
-        logger.info("\n📈 Latest values:")
-        results = self.client.query(query2).result()
-        for row in results:
-            logger.info(f"  {row.series_id}: {row.latest_value} {row.units} (as of {row.latest_date})")
-        
         # Query 3: Mortgage rate trend (last 12 weeks)
         query3 = f"""
         SELECT 
             date,
             ROUND(value, 2) as mortgage_rate_30yr
         FROM `{table_ref}`
-        WHERE series_id = 'MORTGAGE30US'
+        WHERE series_id = @mortgage_series
         ORDER BY date DESC
         LIMIT 12
         """
         
-        logger.info("\n🏠 30-Year Mortgage Rate (last 12 weeks):")
-        results = self.client.query(query3).result()
-        for row in results:
-            logger.info(f"  {row.date}: {row.mortgage_rate_30yr}%")
-        
         # Query 4: CPI year-over-year change
         query4 = f"""
         WITH cpi_data AS (
@@ -291,7 +309,7 @@ class FREDBigQueryUploader:
                 value as cpi,
                 LAG(value, 12) OVER (ORDER BY date) as cpi_year_ago
             FROM `{table_ref}`
-            WHERE series_id = 'CPIAUCSL'
+            WHERE series_id = @cpi_series
         )
         SELECT 
             date,
@@ -303,14 +321,56 @@ class FREDBigQueryUploader:
         LIMIT 12
         """
         
+        # Run all four queries as one multi-statement script: one job
+        # submission and wait instead of four. Child jobs are listed newest
+        # first, so reverse them back into statement order. Series IDs are
+        # bound as parameters so the SQL text stays constant across runs.
+        script = ";\n".join([query1, query2, query3, query4])
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter('mortgage_series', 'STRING', 'MORTGAGE30US'),
+                bigquery.ScalarQueryParameter('cpi_series', 'STRING', 'CPIAUCSL'),
+            ],
+            use_query_cache=True
+        )
+        script_job = self.client.query(script, job_config=job_config)
+        script_job.result()
+        
+        results1, results2, results3, results4 = [
+            job.result()
+            for job in reversed(list(self.client.list_jobs(parent_job=script_job.job_id)))
+        ]
+        
+        logger.info("\n📊 Observations by series:")
+        for row in results1:
+            logger.info(f"\n  {row.series_id} ({row.frequency}):")
+            logger.info(f"    Name: {row.series_name}")
+            logger.info(f"    Observations: {row.observation_count:,}")
+            logger.info(f"    Date range: {row.earliest_date} to {row.latest_date}")
+            logger.info(f"    Value range: {row.min_value} to {row.max_value}")
+        
+        logger.info("\n📈 Latest values:")
+        for row in results2:
+            logger.info(f"  {row.series_id}: {row.latest_value} {row.units} (as of {row.latest_date})")
+        
+        logger.info("\n🏠 30-Year Mortgage Rate (last 12 weeks):")
+        for row in results3:
+            logger.info(f"  {row.date}: {row.mortgage_rate_30yr}%")
+        
         logger.info("\n💰 CPI Year-over-Year Change (last 12 months):")
-        results = self.client.query(query4).result()
-        for row in results:
+        for row in results4:
             logger.info(f"  {row.date}: {row.cpi} (YoY: {row.yoy_change_pct:+.2f}%)")
 
 
 def main():
     """Main execution function"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Upload FRED data to BigQuery')
+    parser.add_argument('--format', choices=['parquet', 'csv'],
+                       help='Input file to upload (default: the newer of fred_combined.parquet/.csv)')
+    args = parser.parse_args()
+    
     # Load configuration from environment variables
     PROJECT_ID = os.getenv('GCP_PROJECT_ID')
     DATASET_ID = os.getenv('GCP_DATASET_ID', 'db')
@@ -327,13 +387,25 @@ def main():
     
     # Paths
     processed_dir = Path(__file__).parent / 'fred_processed'
+    parquet_file = processed_dir / 'fred_combined.parquet'
     csv_file = processed_dir / 'fred_combined.csv'
     
-    # Verify file exists
-    if not csv_file.exists():
-        logger.error(f"CSV file not found: {csv_file}")
-        logger.error("Please run preprocess_fred.py first")
-        return
+    # Pick the input file, defaulting to the most recent preprocessing output
+    if args.format:
+        input_file = parquet_file if args.format == 'parquet' else csv_file
+        if not input_file.exists():
+            logger.error(f"{input_file} not found")
+            logger.error("Please run preprocess_fred.py first")
+            return
+    else:
+        candidates = [f for f in (parquet_file, csv_file) if f.exists()]
+        if not candidates:
+            logger.error(f"Neither {parquet_file} nor {csv_file} found")
+            logger.error("Please run preprocess_fred.py first")
+            return
+        input_file = max(candidates, key=lambda f: f.stat().st_mtime)
+    
+    logger.info(f"Input file: {input_file}")
     
     # Create uploader
     uploader = FREDBigQueryUploader(
@@ -341,12 +413,22 @@ def main():
         dataset_id=DATASET_ID
     )
     
-    # Upload data from CSV
-    uploader.upload_from_csv(
-        table_id=TABLE_ID,
-        csv_file=str(csv_file),
-        write_disposition="WRITE_TRUNCATE"  # Replace existing data
-    )
+    if input_file == parquet_file:
+        # Upload data from Parquet
+        uploader.upload_from_parquet(
+            table_id=TABLE_ID,
+            parquet_file=str(parquet_file),
+            write_disposition="WRITE_TRUNCATE"  # Replace existing data
+        )
+    else:
+        # Upload data from CSV (gzipped; BigQuery decompresses on load).
+        # The archive lives in a temp dir so nothing is left in fred_processed/
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            uploader.upload_from_csv(
+                table_id=TABLE_ID,
+                csv_file=str(gzip_csv(csv_file, Path(tmp_dir))),
+                write_disposition="WRITE_TRUNCATE"  # Replace existing data
+            )
     
     # Run validation queries
     uploader.run_validation_queries(TABLE_ID)
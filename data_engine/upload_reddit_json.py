@@ -1,30 +1,54 @@
-"""Upload Reddit data to BigQuery using JSON format (more reliable than CSV)"""
+"""Upload Reddit data to BigQuery using Parquet format (more reliable than CSV)"""
 from google.cloud import bigquery
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
-import json
 
 client = bigquery.Client(project='vant-486316')
 
-# Load CSV
-csv_file = Path(__file__).parent / 'reddit_processed' / 'reddit_posts.csv'
-df = pd.read_csv(csv_file)
+# Column types pinned so every chunk serializes to the same Parquet schema
+CSV_DTYPES = {
+    'post_id': 'str',
+    'subreddit': 'str',
+    'created_utc': 'float64',  # Existing BigQuery column is FLOAT
+    'created_date': 'str',
+    'title': 'str',
+    'selftext': 'str',
+    'score': 'Int64',
+    'num_comments': 'Int64',
+    'author': 'str',
+    'location': 'str',
+    'purchase_price': 'float64',
+    'city_mentions': 'str',
+    'permalink': 'str',
+}
+CHUNK_SIZE = 50_000
 
-print(f"Loaded {len(df)} posts from CSV")
+csv_file = Path(__file__).parent / 'reddit_processed' / 'reddit_posts.csv'
 
-# Convert to JSON Lines format (newline-delimited JSON)
-json_file = Path(__file__).parent / 'reddit_processed' / 'reddit_posts.jsonl'
+# Convert to Parquet (columnar, compressed, self-describing schema),
+# streaming the CSV in chunks so memory stays flat regardless of size
+parquet_file = Path(__file__).parent / 'reddit_processed' / 'reddit_posts.parquet'
 
-# Convert DataFrame to JSON Lines
-with open(json_file, 'w', encoding='utf-8') as f:
-    for _, row in df.iterrows():
-        # Convert row to dict, handling NaN values
-        row_dict = row.to_dict()
-        # Replace NaN with None for JSON
-        row_dict = {k: (None if pd.isna(v) else v) for k, v in row_dict.items()}
-        f.write(json.dumps(row_dict) + '\n')
+total_rows = 0
+writer = None
+try:
+    for chunk in pd.read_csv(csv_file, dtype=CSV_DTYPES, chunksize=CHUNK_SIZE):
+        # Store created_date as a real DATE, as JSON autodetection used to infer
+        chunk['created_date'] = pd.to_datetime(chunk['created_date'], format='%Y-%m-%d').dt.date
+        
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(parquet_file, table.schema, compression='snappy')
+        writer.write_table(table.cast(writer.schema))
+        total_rows += len(chunk)
+finally:
+    if writer is not None:
+        writer.close()
 
-print(f"Converted to JSON Lines: {json_file}")
+print(f"Loaded {total_rows} posts from CSV")
+print(f"Converted to Parquet: {parquet_file}")
 
 # Delete existing table
 table_id = 'vant-486316.db.reddit_posts'
@@ -34,15 +58,14 @@ try:
 except:
     pass
 
-# Configure job for JSON
+# Configure job for Parquet (schema comes from the file itself)
 job_config = bigquery.LoadJobConfig(
-    source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
-    autodetect=True,
+    source_format=bigquery.SourceFormat.PARQUET,
     write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
 )
 
-# Upload from JSON file
-with open(json_file, 'rb') as f:
+# Upload from Parquet file
+with open(parquet_file, 'rb') as f:
     job = client.load_table_from_file(f, table_id, job_config=job_config)
 
 print(f"Starting upload job: {job.job_id}")
@@ -65,4 +88,4 @@ result = client.query(query).result()
 for row in result:
     print(f"Query confirms: {row.count} rows")
 
-print("\nSuccess! Reddit data uploaded via JSON format")
+print("\nSuccess! Reddit data uploaded via Parquet format")
@@ -6,9 +6,13 @@ Handles post-level data with deduplication on post_id.
 """
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
 from pathlib import Path
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from dotenv import load_dotenv
 import os
@@ -27,6 +31,47 @@ logger = logging.getLogger(__name__)
 class RedditBigQueryUploader:
     """Handles uploading Reddit data to BigQuery"""
     
+    # Table schema (also passed to load jobs so Parquet columns map exactly)
+    SCHEMA = [
+        bigquery.SchemaField("post_id", "STRING", mode="REQUIRED", description="Unique Reddit post ID"),
+        bigquery.SchemaField("subreddit", "STRING", mode="REQUIRED", description="Subreddit name"),
+        bigquery.SchemaField("created_utc", "TIMESTAMP", mode="REQUIRED", description="Post creation time (UTC)"),
+        bigquery.SchemaField("created_date", "DATE", mode="REQUIRED", description="Post creation date (partition key)"),
+        bigquery.SchemaField("title", "STRING", mode="NULLABLE", description="Post title"),
+        bigquery.SchemaField("selftext", "STRING", mode="NULLABLE", description="Full post body text"),
+        bigquery.SchemaField("score", "INTEGER", mode="NULLABLE", description="Upvotes minus downvotes"),
+        bigquery.SchemaField("num_comments", "INTEGER", mode="NULLABLE", description="Number of comments"),
+        bigquery.SchemaField("author", "STRING", mode="NULLABLE", description="Reddit username"),
+        bigquery.SchemaField("location", "STRING", mode="NULLABLE", description="Extracted location (FirstTimeHomeBuyer)"),
+        bigquery.SchemaField("purchase_price", "FLOAT", mode="NULLABLE", description="Extracted purchase price (FirstTimeHomeBuyer)"),
+        bigquery.SchemaField("city_mentions", "STRING", mode="NULLABLE", description="Pipe-separated cities (SameGrassButGreener)"),
+        bigquery.SchemaField("permalink", "STRING", mode="NULLABLE", description="Reddit post URL"),
+        bigquery.SchemaField("updated_at", "TIMESTAMP", mode="NULLABLE", description="When record was inserted"),
+    ]
+    
+    # Column types for parsing the processed CSV (pinned so all-empty
+    # columns don't come back as null-typed)
+    CSV_COLUMN_TYPES = {
+        'post_id': pa.string(),
+        'subreddit': pa.string(),
+        'created_utc': pa.float64(),
+        'created_date': pa.string(),
+        'title': pa.string(),
+        'selftext': pa.string(),
+        'score': pa.int64(),
+        'num_comments': pa.int64(),
+        'author': pa.string(),
+        'location': pa.string(),
+        'purchase_price': pa.float64(),
+        'city_mentions': pa.string(),
+        'permalink': pa.string(),
+    }
+    
+    # Large uploads are split into Parquet shards loaded concurrently (kept
+    # to a handful of jobs per run because of per-table load job quotas)
+    SHARD_ROWS = 1_000_000
+    MAX_SHARDS = 8
+    
     def __init__(self, project_id: str, dataset_id: str, table_id: str):
         """
         Initialize uploader
@@ -43,6 +88,9 @@ class RedditBigQueryUploader:
         
         # Full table reference
         self.table_ref = f"{project_id}.{dataset_id}.{table_id}"
+        
+        # Staging table for server-side deduplication
+        self.staging_ref = f"{self.table_ref}_staging"
     
     def table_exists(self) -> bool:
         """Check if table exists"""
@@ -56,24 +104,7 @@ class RedditBigQueryUploader:
         """Create table with schema"""
         logger.info(f"Creating table {self.table_ref}...")
         
-        schema = [
-            bigquery.SchemaField("post_id", "STRING", mode="REQUIRED", description="Unique Reddit post ID"),
-            bigquery.SchemaField("subreddit", "STRING", mode="REQUIRED", description="Subreddit name"),
-            bigquery.SchemaField("created_utc", "TIMESTAMP", mode="REQUIRED", description="Post creation time (UTC)"),
-            bigquery.SchemaField("created_date", "DATE", mode="REQUIRED", description="Post creation date (partition key)"),
-            bigquery.SchemaField("title", "STRING", mode="NULLABLE", description="Post title"),
-            bigquery.SchemaField("selftext", "STRING", mode="NULLABLE", description="Full post body text"),
-            bigquery.SchemaField("score", "INTEGER", mode="NULLABLE", description="Upvotes minus downvotes"),
-            bigquery.SchemaField("num_comments", "INTEGER", mode="NULLABLE", description="Number of comments"),
-            bigquery.SchemaField("author", "STRING", mode="NULLABLE", description="Reddit username"),
-            bigquery.SchemaField("location", "STRING", mode="NULLABLE", description="Extracted location (FirstTimeHomeBuyer)"),
-            bigquery.SchemaField("purchase_price", "FLOAT", mode="NULLABLE", description="Extracted purchase price (FirstTimeHomeBuyer)"),
-            bigquery.SchemaField("city_mentions", "STRING", mode="NULLABLE", description="Pipe-separated cities (SameGrassButGreener)"),
-            bigquery.SchemaField("permalink", "STRING", mode="NULLABLE", description="Reddit post URL"),
-            bigquery.SchemaField("updated_at", "TIMESTAMP", mode="NULLABLE", description="When record was inserted"),
-        ]
-        
-        table = bigquery.Table(self.table_ref, schema=schema)
+        table = bigquery.Table(self.table_ref, schema=self.SCHEMA)
         
         # Configure partitioning
         table.time_partitioning = bigquery.TimePartitioning(
@@ -91,26 +122,101 @@ class RedditBigQueryUploader:
         table = self.client.create_table(table)
         logger.info(f"✅ Created table {self.table_ref}")
     
-    def get_existing_post_ids(self) -> set:
-        """Get set of existing post IDs to avoid duplicates"""
-        if not self.table_exists():
-            return set()
+    def merge_staging(self, df: pd.DataFrame) -> int:
+        """
+        Insert staged posts whose post_id is not already in the table
         
+        Args:
+            df: DataFrame that was loaded into the staging table
+            
+        Returns:
+            Number of rows inserted
+        """
+        columns = [field.name for field in self.SCHEMA]
+        
+        # Only compare against the date window and subreddits being uploaded
+        # so BigQuery prunes partitions and cluster blocks of the target.
+        # Older rows stored created_date as a local date, which can be a day
+        # off from the UTC date, so the window is widened by a day each side
         query = f"""
-        SELECT DISTINCT post_id
-        FROM `{self.table_ref}`
+        MERGE `{self.table_ref}` T
+        USING `{self.staging_ref}` S
+        ON T.post_id = S.post_id
+            AND T.created_date BETWEEN DATE_SUB(@min_date, INTERVAL 1 DAY)
+                                   AND DATE_ADD(@max_date, INTERVAL 1 DAY)
+            AND T.subreddit IN UNNEST(@subreddits)
+        WHEN NOT MATCHED THEN
+            INSERT ({', '.join(columns)})
+            VALUES ({', '.join('S.' + col for col in columns)})
         """
         
-        logger.info("Fetching existing post IDs...")
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter('min_date', 'DATE', df['created_date'].min()),
+                bigquery.ScalarQueryParameter('max_date', 'DATE', df['created_date'].max()),
+                bigquery.ArrayQueryParameter('subreddits', 'STRING', df['subreddit'].unique().tolist()),
+            ]
+        )
         
-        try:
-            result = self.client.query(query).result()
-            post_ids = {row.post_id for row in result}
-            logger.info(f"Found {len(post_ids)} existing posts")
-            return post_ids
-        except Exception as e:
-            logger.warning(f"Could not fetch existing post IDs: {e}")
-            return set()
+        logger.info("Merging new posts from staging table...")
+        job = self.client.query(query, job_config=job_config)
+        job.result()
+        
+        return job.num_dml_affected_rows or 0
+    
+    def write_parquet_shards(self, df: pd.DataFrame, parquet_file: Path) -> List[Path]:
+        """
+        Write the upload DataFrame as one or more Parquet files
+        
+        Args:
+            df: Prepared DataFrame matching SCHEMA
+            parquet_file: Path for a single-file upload (shards get a _partN suffix)
+            
+        Returns:
+            Paths of the written Parquet files
+        """
+        n_shards = min(self.MAX_SHARDS, -(-len(df) // self.SHARD_ROWS))
+        
+        if n_shards <= 1:
+            df.to_parquet(parquet_file, engine='pyarrow', compression='snappy', index=False)
+            return [parquet_file]
+        
+        bounds = [len(df) * i // n_shards for i in range(n_shards + 1)]
+        shard_files = []
+        for i in range(n_shards):
+            shard_file = parquet_file.with_name(f"{parquet_file.stem}_part{i}.parquet")
+            df.iloc[bounds[i]:bounds[i + 1]].to_parquet(
+                shard_file, engine='pyarrow', compression='snappy', index=False
+            )
+            shard_files.append(shard_file)
+        
+        return shard_files
+    
+    def load_parquet_files(
+        self,
+        parquet_files: List[Path],
+        destination: str,
+        job_config: bigquery.LoadJobConfig
+    ) -> None:
+        """
+        Load Parquet files into a table with concurrent load jobs
+        
+        Args:
+            parquet_files: Parquet files to load
+            destination: Fully qualified destination table
+            job_config: Load job configuration (must append)
+        """
+        def load(parquet_file: Path):
+            with open(parquet_file, 'rb') as f:
+                job = self.client.load_table_from_file(
+                    f,
+                    destination,
+                    job_config=job_config
+                )
+            return job.result()
+        
+        with ThreadPoolExecutor(max_workers=len(parquet_files)) as executor:
+            list(executor.map(load, parquet_files))
     
     def upload_data(self, csv_file: str, deduplicate: bool = True):
         """
@@ -131,66 +237,93 @@ class RedditBigQueryUploader:
             return
         
         logger.info(f"Loading data from {csv_file}...")
-        df = pd.read_csv(csv_file)
+        # Parse with PyArrow's multithreaded C++ CSV reader
+        table = pacsv.read_csv(
+            csv_file,
+            # Post bodies contain quoted newlines
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(
+                column_types=self.CSV_COLUMN_TYPES,
+                strings_can_be_null=True
+            )
+        )
+        # Keep string columns Arrow-backed (zero-copy here and on the Parquet
+        # write) instead of converting them to Python objects
+        df = table.to_pandas(
+            self_destruct=True,
+            types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get
+        )
+        del table
         logger.info(f"Loaded {len(df)} posts")
         
         # Create table if it doesn't exist
         if not self.table_exists():
             self.create_table()
         
-        # Deduplicate if requested
-        if deduplicate:
-            existing_ids = self.get_existing_post_ids()
-            
-            if existing_ids:
-                original_count = len(df)
-                df = df[~df['post_id'].isin(existing_ids)]
-                logger.info(f"Filtered out {original_count - len(df)} duplicate posts")
-                logger.info(f"Uploading {len(df)} new posts")
-        
         if len(df) == 0:
             logger.info("No new data to upload")
             return
         
-        # Convert created_utc to timestamp
-        df['created_utc'] = pd.to_datetime(df['created_utc'], unit='s')
+        # Convert created_utc (epoch seconds, UTC) to timestamp and
+        # created_date to a real date so Parquet carries the table's types
+        df['created_utc'] = pd.to_datetime(df['created_utc'], unit='s', utc=True)
+        df['created_date'] = pd.to_datetime(df['created_date'], format='%Y-%m-%d').dt.date
         
-        # Add updated_at timestamp
-        df['updated_at'] = pd.Timestamp.now()
+        # Add updated_at timestamp (UTC-aware, so Parquet marks it as UTC)
+        df['updated_at'] = pd.Timestamp.now(tz='UTC')
         
         # Ensure proper data types
-        df['score'] = df['score'].astype('Int64')
-        df['num_comments'] = df['num_comments'].astype('Int64')
+        df = df.astype({'score': 'Int64', 'num_comments': 'Int64'})
         
         # Handle NaN values in string columns
         string_cols = ['title', 'selftext', 'author', 'location', 'city_mentions', 'permalink']
-        for col in string_cols:
-            if col in df.columns:
-                df[col] = df[col].fillna('')
-        
-        # Configure load job
-        job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-            schema_update_options=[
-                bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION
-            ]
-        )
+        present = df.columns.intersection(string_cols)
+        df[present] = df[present].fillna('')
+        
+        # Serialize once to local Parquet file(s) (reusable on retry)
+        parquet_files = self.write_parquet_shards(df, csv_path.with_suffix('.parquet'))
+        
+        # Configure load job: when deduplicating, load into a staging table
+        # and let BigQuery MERGE only new post_ids into the target;
+        # otherwise append straight to the target
+        if deduplicate:
+            destination = self.staging_ref
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+                schema=self.SCHEMA
+            )
+        else:
+            destination = self.table_ref
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+                schema=self.SCHEMA,
+                schema_update_options=[
+                    bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION
+                ]
+            )
         
         # Upload to BigQuery
-        logger.info(f"Starting upload to {self.table_ref}...")
+        logger.info(f"Starting upload to {destination} ({len(parquet_files)} file(s))...")
         
         try:
-            job = self.client.load_table_from_dataframe(
-                df,
-                self.table_ref,
-                job_config=job_config
-            )
+            if deduplicate:
+                # Start from an empty staging table so shards can append to it
+                self.client.delete_table(self.staging_ref, not_found_ok=True)
+                self.client.create_table(bigquery.Table(self.staging_ref, schema=self.SCHEMA))
+            
+            # Load all files and wait for every job to complete
+            self.load_parquet_files(parquet_files, destination, job_config)
             
-            # Wait for job to complete
-            job.result()
+            if deduplicate:
+                uploaded = self.merge_staging(df)
+                logger.info(f"Filtered out {len(df) - uploaded} duplicate posts")
+            else:
+                uploaded = len(df)
             
             logger.info(f"✅ Upload complete!")
-            logger.info(f"Uploaded {len(df)} posts")
+            logger.info(f"Uploaded {uploaded} posts")
             
             # Get table info
             table = self.client.get_table(self.table_ref)
@@ -199,6 +332,9 @@ class RedditBigQueryUploader:
         except Exception as e:
             logger.error(f"Upload failed: {e}")
             raise
+        finally:
+            if deduplicate:
+                self.client.delete_table(self.staging_ref, not_found_ok=True)
     
     def verify_upload(self):
         """Verify upload with sample queries"""
@@ -206,57 +342,42 @@ class RedditBigQueryUploader:
         logger.info("Verifying upload...")
         logger.info(f"{'='*60}")
         
-        # Query 1: Total posts by subreddit
-        query1 = f"""
+        # Single scan: per-subreddit counts plus the extraction stats
+        query = f"""
         SELECT 
             subreddit,
             COUNT(*) as post_count,
             MIN(created_date) as earliest_post,
-            MAX(created_date) as latest_post
+            MAX(created_date) as latest_post,
+            COUNTIF(location IS NOT NULL) as posts_with_location,
+            COUNTIF(purchase_price IS NOT NULL) as posts_with_price,
+            ROUND(AVG(purchase_price), 0) as avg_price,
+            COUNTIF(city_mentions IS NOT NULL) as posts_with_cities
         FROM `{self.table_ref}`
         GROUP BY subreddit
         ORDER BY subreddit
         """
         
+        stats = {row.subreddit: row for row in self.client.query(query).result()}
+        
         logger.info("\n📊 Posts by subreddit:")
-        result = self.client.query(query1).result()
-        for row in result:
+        for row in stats.values():
             logger.info(f"  r/{row.subreddit}: {row.post_count:,} posts ({row.earliest_post} to {row.latest_post})")
         
-        # Query 2: FirstTimeHomeBuyer extraction stats
-        query2 = f"""
-        SELECT 
-            COUNT(*) as total_posts,
-            COUNTIF(location IS NOT NULL) as posts_with_location,
-            COUNTIF(purchase_price IS NOT NULL) as posts_with_price,
-            ROUND(AVG(purchase_price), 0) as avg_price
-        FROM `{self.table_ref}`
-        WHERE subreddit = 'FirstTimeHomeBuyer'
-        """
-        
-        logger.info("\n📊 FirstTimeHomeBuyer extraction stats:")
-        result = self.client.query(query2).result()
-        for row in result:
-            logger.info(f"  Total posts: {row.total_posts:,}")
-            logger.info(f"  Posts with location: {row.posts_with_location:,} ({row.posts_with_location/row.total_posts*100:.1f}%)")
-            logger.info(f"  Posts with price: {row.posts_with_price:,} ({row.posts_with_price/row.total_posts*100:.1f}%)")
+        row = stats.get('FirstTimeHomeBuyer')
+        if row:
+            logger.info("\n📊 FirstTimeHomeBuyer extraction stats:")
+            logger.info(f"  Total posts: {row.post_count:,}")
+            logger.info(f"  Posts with location: {row.posts_with_location:,} ({row.posts_with_location/row.post_count*100:.1f}%)")
+            logger.info(f"  Posts with price: {row.posts_with_price:,} ({row.posts_with_price/row.post_count*100:.1f}%)")
             if row.avg_price:
                 logger.info(f"  Average price: ${row.avg_price:,.0f}")
         
-        # Query 3: SameGrassButGreener city mentions
-        query3 = f"""
-        SELECT 
-            COUNT(*) as total_posts,
-            COUNTIF(city_mentions IS NOT NULL) as posts_with_cities
-        FROM `{self.table_ref}`
-        WHERE subreddit = 'SameGrassButGreener'
-        """
-        
-        logger.info("\n📊 SameGrassButGreener extraction stats:")
-        result = self.client.query(query3).result()
-        for row in result:
-            logger.info(f"  Total posts: {row.total_posts:,}")
-            logger.info(f"  Posts with city mentions: {row.posts_with_cities:,} ({row.posts_with_cities/row.total_posts*100:.1f}%)")
+        row = stats.get('SameGrassButGreener')
+        if row:
+            logger.info("\n📊 SameGrassButGreener extraction stats:")
+            logger.info(f"  Total posts: {row.post_count:,}")
+            logger.info(f"  Posts with city mentions: {row.posts_with_cities:,} ({row.posts_with_cities/row.post_count*100:.1f}%)")
         
         logger.info("\n✅ Verification complete!")
 
@@ -6,7 +6,10 @@ partitioning, and clustering configuration.
 """
 
 from google.cloud import bigquery
+from google.cloud import storage
 from pathlib import Path
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 import os
 from dotenv import load_dotenv
@@ -25,18 +28,64 @@ logger = logging.getLogger(__name__)
 class BigQueryUploader:
     """Handles uploading data to BigQuery"""
     
-    def __init__(self, project_id: str, dataset_id: str):
+    # Long-format Zillow table schema
+    SCHEMA = [
+        bigquery.SchemaField("region_id", "INTEGER", mode="REQUIRED"),
+        bigquery.SchemaField("region_name", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("region_type", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("state_name", "STRING", mode="NULLABLE"),
+        bigquery.SchemaField("metric_type", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
+        bigquery.SchemaField("value", "FLOAT", mode="REQUIRED"),
+    ]
+    
+    # Files at least this large are staged in GCS (when a bucket is set) so
+    # BigQuery reads them in parallel instead of via one HTTP upload stream
+    GCS_STAGING_MIN_BYTES = 256 * 1024 * 1024
+    GCS_CHUNK_SIZE = 16 * 1024 * 1024
+    
+    def __init__(self, project_id: str, dataset_id: str, staging_bucket: Optional[str] = None):
         """
         Initialize BigQuery uploader
         
         Args:
             project_id: GCP project ID
             dataset_id: BigQuery dataset ID
+            staging_bucket: Optional GCS bucket for staging large files
         """
         self.project_id = project_id
         self.dataset_id = dataset_id
+        self.staging_bucket = staging_bucket
         self.client = bigquery.Client(project=project_id)
+        self._known_tables: Optional[set] = None
+        
+    def _table_exists(self, table_id: str) -> bool:
+        """Check table existence against one cached listing of the dataset"""
+        if self._known_tables is None:
+            self._known_tables = {
+                table.table_id
+                for table in self.client.list_tables(f"{self.project_id}.{self.dataset_id}")
+            }
+        return table_id in self._known_tables
+    
+    def _stage_to_gcs(self, local_path: Path) -> storage.Blob:
+        """
+        Upload a local file to the staging bucket
+        
+        Args:
+            local_path: File to upload
+            
+        Returns:
+            Uploaded blob
+        """
+        bucket = storage.Client(project=self.project_id).bucket(self.staging_bucket)
+        blob = bucket.blob(f"bq_staging/{local_path.name}", chunk_size=self.GCS_CHUNK_SIZE)
+        
+        logger.info(f"Staging {local_path.name} to gs://{self.staging_bucket}/{blob.name}...")
+        blob.upload_from_filename(str(local_path))
         
+        return blob
+    
     def create_table(self, table_id: str) -> bigquery.Table:
         """
         Create BigQuery table with proper schema and configuration
@@ -47,20 +96,9 @@ class BigQueryUploader:
         Returns:
             Created table object
         """
-        # Define schema
-        schema = [
-            bigquery.SchemaField("region_id", "INTEGER", mode="REQUIRED"),
-            bigquery.SchemaField("region_name", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("region_type", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("state_name", "STRING", mode="NULLABLE"),
-            bigquery.SchemaField("metric_type", "STRING", mode="REQUIRED"),
-            bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
-            bigquery.SchemaField("value", "FLOAT", mode="REQUIRED"),
-        ]
-        
         # Create table reference
         table_ref = f"{self.project_id}.{self.dataset_id}.{table_id}"
-        table = bigquery.Table(table_ref, schema=schema)
+        table = bigquery.Table(table_ref, schema=self.SCHEMA)
         
         # Configure partitioning (by date, monthly)
         table.time_partitioning = bigquery.TimePartitioning(
@@ -109,11 +147,11 @@ class BigQueryUploader:
         table_ref = f"{self.project_id}.{self.dataset_id}.{table_id}"
         
         if not skip_table_creation:
-            try:
-                self.client.get_table(table_ref)
+            if self._table_exists(table_id):
                 logger.warning(f"Table {table_ref} already exists, will append data")
-            except Exception:
+            else:
                 self.create_table(table_id)
+                self._known_tables.add(table_id)
         
         # Configure load job
         job_config = bigquery.LoadJobConfig(
@@ -121,27 +159,45 @@ class BigQueryUploader:
             write_disposition=write_disposition,
         )
         
-        # Use autodetect for new tables
+        # Use autodetect for new tables; otherwise the schema is already known
         if skip_table_creation:
             job_config.autodetect = True
+        else:
+            job_config.schema = self.SCHEMA
         
-        # Load data
-        with open(parquet_file, 'rb') as f:
-            job = self.client.load_table_from_file(
-                f,
-                table_ref,
-                job_config=job_config
-            )
+        parquet_path = Path(parquet_file)
         
-        logger.info("Waiting for upload to complete...")
-        job.result()  # Wait for completion
+        if self.staging_bucket and parquet_path.stat().st_size >= self.GCS_STAGING_MIN_BYTES:
+            # Large file: stage in GCS and let BigQuery load from the URI
+            blob = self._stage_to_gcs(parquet_path)
+            try:
+                job = self.client.load_table_from_uri(
+                    f"gs://{self.staging_bucket}/{blob.name}",
+                    table_ref,
+                    job_config=job_config
+                )
+                
+                logger.info("Waiting for upload to complete...")
+                job.result()  # Wait for completion
+            finally:
+                blob.delete()
+        else:
+            # Load data
+            with open(parquet_path, 'rb') as source_file:
+                job = self.client.load_table_from_file(
+                    source_file,
+                    table_ref,
+                    job_config=job_config
+                )
+            
+            logger.info("Waiting for upload to complete...")
+            job.result()  # Wait for completion
         
-        # Get table info
-        table = self.client.get_table(table_ref)
+        # Report from the job statistics instead of re-fetching the table
         logger.info(f"✅ Upload complete!")
         logger.info(f"  Table: {table_ref}")
-        logger.info(f"  Rows: {table.num_rows:,}")
-        logger.info(f"  Size: {table.num_bytes / 1024 / 1024:.2f} MB")
+        logger.info(f"  Rows loaded: {job.output_rows:,}")
+        logger.info(f"  Size loaded: {job.output_bytes / 1024 / 1024:.2f} MB")
         
     def run_validation_queries(self, table_id: str):
         """
@@ -168,11 +224,6 @@ class BigQueryUploader:
         ORDER BY row_count DESC
         """
         
-        logger.info("\n📊 Row count by metric:")
-        results = self.client.query(query1).result()
-        for row in results:
-            logger.info(f"  {row.metric_type}: {row.row_count:,} rows ({row.earliest_date} to {row.latest_date})")
-        
         # Query 2: National median sale price trend (last 12 months)
         query2 = f"""
         SELECT 
@@ -180,34 +231,61 @@ class BigQueryUploader:
             value as median_sale_price
         FROM `{table_ref}`
         WHERE region_name = 'United States'
-          AND metric_type = 'median_sale_price'
-          AND date >= TIMESTAMP(DATE_SUB(CURRENT_DATE(), INTERVAL 12 MONTH))
+          AND metric_type = @price_metric
+          AND date >= DATE_SUB(CURRENT_DATE(), INTERVAL @months MONTH)
         ORDER BY date DESC
         LIMIT 12
         """
         
-        logger.info("\n📈 National median sale price (last 12 months):")
-        results = self.client.query(query2).result()
-        for row in results:
-            logger.info(f"  {row.date}: ${row.median_sale_price:,.0f}")
-        
         # Query 3: Top 10 MSAs by ZHVI
         query3 = f"""
         SELECT 
             region_name,
             value as zhvi
         FROM `{table_ref}`
-        WHERE metric_type = 'zhvi'
+        WHERE metric_type = @zhvi_metric
           AND region_type = 'msa'
-          AND date = (SELECT MAX(date) FROM `{table_ref}` WHERE metric_type = 'zhvi')
+          AND date = (SELECT MAX(date) FROM `{table_ref}` WHERE metric_type = @zhvi_metric)
         ORDER BY value DESC
         LIMIT 10
         """
         
-        logger.info("\n🏆 Top 10 MSAs by ZHVI (most recent):")
-        results = self.client.query(query3).result()
-        for i, row in enumerate(results, 1):
-            logger.info(f"  {i}. {row.region_name}: ${row.zhvi:,.0f}")
+        # Run all three queries as one multi-statement script: one job
+        # submission and wait instead of three. Child jobs are listed newest
+        # first, so reverse them back into statement order. Filter values
+        # are bound as parameters so the SQL text stays constant across runs.
+        script = ";\n".join([query1, query2, query3])
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter('price_metric', 'STRING', 'median_sale_price'),
+                bigquery.ScalarQueryParameter('months', 'INT64', 12),
+                bigquery.ScalarQueryParameter('zhvi_metric', 'STRING', 'zhvi'),
+            ],
+            use_query_cache=True
+        )
+        script_job = self.client.query(script, job_config=job_config)
+        script_job.result()
+        
+        results1, results2, results3 = [
+            job.result()
+            for job in reversed(list(self.client.list_jobs(parent_job=script_job.job_id)))
+        ]
+        
+        # One log call per section instead of one per row
+        lines = ["\n📊 Row count by metric:"]
+        lines += [
+            f"  {row.metric_type}: {row.row_count:,} rows ({row.earliest_date} to {row.latest_date})"
+            for row in results1
+        ]
+        logger.info("\n".join(lines))
+        
+        lines = ["\n📈 National median sale price (last 12 months):"]
+        lines += [f"  {row.date}: ${row.median_sale_price:,.0f}" for row in results2]
+        logger.info("\n".join(lines))
+        
+        lines = ["\n🏆 Top 10 MSAs by ZHVI (most recent):"]
+        lines += [f"  {i}. {row.region_name}: ${row.zhvi:,.0f}" for i, row in enumerate(results3, 1)]
+        logger.info("\n".join(lines))
 
 
 def main():
@@ -216,6 +294,7 @@ def main():
     PROJECT_ID = os.getenv('GCP_PROJECT_ID')
     DATASET_ID = os.getenv('GCP_DATASET_ID', 'housing_data')
     TABLE_ID = os.getenv('GCP_TABLE_ID', 'zillow_metrics')
+    STAGING_BUCKET = os.getenv('GCS_STAGING_BUCKET')
     
     # Validate required environment variables
     if not PROJECT_ID:
@@ -241,55 +320,48 @@ def main():
     # Create uploader
     uploader = BigQueryUploader(
         project_id=PROJECT_ID,
-        dataset_id=DATASET_ID
-    )
-    
-    logger.info("\n" + "="*60)
-    logger.info("Uploading long-format data...")
-    logger.info("="*60)
-    
-    # Upload main table (long format)
-    uploader.upload_from_parquet(
-        table_id=TABLE_ID,
-        parquet_file=str(parquet_file),
-        write_disposition="WRITE_TRUNCATE"
+        dataset_id=DATASET_ID,
+        staging_bucket=STAGING_BUCKET
     )
     
-    # Run validation queries (commented out due to timestamp comparison error)
-    # uploader.run_validation_queries(TABLE_ID)
+    # Uploads as (table_id, parquet_file, skip_table_creation); the derived
+    # tables use autodetect for their schema
+    uploads = [(TABLE_ID, parquet_file, False)]
     
-    # Upload city latest table if it exists
     if city_latest_file.exists():
-        logger.info("\n" + "="*60)
-        logger.info("Uploading city latest table...")
-        logger.info("="*60)
-        
-        uploader.upload_from_parquet(
-            table_id='zillow_city_latest',
-            parquet_file=str(city_latest_file),
-            write_disposition="WRITE_TRUNCATE",
-            skip_table_creation=True  # Use autodetect for schema
-        )
-        logger.info("✅ City latest table uploaded successfully")
+        uploads.append(('zillow_city_latest', city_latest_file, True))
     else:
         logger.warning(f"City latest file not found: {city_latest_file}")
     
-    # Upload state aggregated table if it exists
     if state_agg_file.exists():
-        logger.info("\n" + "="*60)
-        logger.info("Uploading state aggregated table...")
-        logger.info("="*60)
-        
-        uploader.upload_from_parquet(
-            table_id='zillow_state_aggregated',
-            parquet_file=str(state_agg_file),
-            write_disposition="WRITE_TRUNCATE",
-            skip_table_creation=True  # Use autodetect for schema
-        )
-        logger.info("✅ State aggregated table uploaded successfully")
+        uploads.append(('zillow_state_aggregated', state_agg_file, True))
     else:
         logger.warning(f"State aggregated file not found: {state_agg_file}")
     
+    logger.info("\n" + "="*60)
+    logger.info(f"Uploading {len(uploads)} tables...")
+    logger.info("="*60)
+    
+    # Load jobs are independent, so run them concurrently and wait on all
+    with ThreadPoolExecutor(max_workers=len(uploads)) as executor:
+        futures = {
+            executor.submit(
+                uploader.upload_from_parquet,
+                table_id=table_id,
+                parquet_file=str(file),
+                write_disposition="WRITE_TRUNCATE",
+                skip_table_creation=skip_table_creation
+            ): table_id
+            for table_id, file, skip_table_creation in uploads
+        }
+        
+        for future in as_completed(futures):
+            future.result()
+            logger.info(f"✅ {futures[future]} table uploaded successfully")
+    
+    # Run validation queries
+    uploader.run_validation_queries(TABLE_ID)
+    
     logger.info("\n" + "="*60)
     logger.info("✅ All uploads complete!")
     logger.info("="*60)
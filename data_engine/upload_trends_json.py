@@ -1,30 +1,38 @@
-"""Upload Google Trends data to BigQuery using JSON format"""
+"""Upload Google Trends data to BigQuery using Parquet format"""
 from google.cloud import bigquery
-import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
 from pathlib import Path
-import json
 
 client = bigquery.Client(project='vant-486316')
 
-# Load CSV
+# Convert to Parquet (columnar, compressed, self-describing schema),
+# streaming record batches so the CSV is never fully held in memory
 csv_file = Path(__file__).parent / 'trends_processed' / 'trends_data.csv'
-df = pd.read_csv(csv_file, parse_dates=['date'])
+parquet_file = Path(__file__).parent / 'trends_processed' / 'trends_data.parquet'
 
-print(f"Loaded {len(df)} records from CSV")
-
-# Convert to JSON Lines format
-json_file = Path(__file__).parent / 'trends_processed' / 'trends_data.jsonl'
+# Pin every column type: open_csv infers types from the first block only,
+# and week_start_date must load as a DATE rather than a string
+reader = pacsv.open_csv(
+    csv_file,
+    convert_options=pacsv.ConvertOptions(column_types={
+        'week_start_date': pa.date32(),
+        'search_term': pa.string(),
+        'category': pa.string(),
+        'avg_interest_score': pa.int64(),
+        'region': pa.string(),
+    })
+)
 
-with open(json_file, 'w', encoding='utf-8') as f:
-    for _, row in df.iterrows():
-        # Convert row to dict, handling NaN values and dates
-        row_dict = row.to_dict()
-        # Replace NaN with None and convert date to string
-        row_dict = {k: (None if pd.isna(v) else (v.strftime('%Y-%m-%d') if k == 'date' else v)) 
-                   for k, v in row_dict.items()}
-        f.write(json.dumps(row_dict) + '\n')
+total_rows = 0
+with pq.ParquetWriter(parquet_file, reader.schema, compression='snappy') as writer:
+    for batch in reader:
+        writer.write_batch(batch)
+        total_rows += batch.num_rows
 
-print(f"Converted to JSON Lines: {json_file}")
+print(f"Loaded {total_rows} records from CSV")
+print(f"Converted to Parquet: {parquet_file}")
 
 # Delete existing table
 table_id = 'vant-486316.db.trends_metrics'
@@ -34,15 +42,14 @@ try:
 except:
     pass
 
-# Configure job for JSON
+# Configure job for Parquet (schema comes from the file itself)
 job_config = bigquery.LoadJobConfig(
-    source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
-    autodetect=True,
+    source_format=bigquery.SourceFormat.PARQUET,
     write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
 )
 
-# Upload from JSON file
-with open(json_file, 'rb') as f:
+# Upload from Parquet file
+with open(parquet_file, 'rb') as f:
     job = client.load_table_from_file(f, table_id, job_config=job_config)
 
 print(f"Starting upload job: {job.job_id}")
@@ -65,4 +72,4 @@ result = client.query(query).result()
 for row in result:
     print(f"Query confirms: {row.count} rows")
 
-print("\nSuccess! Google Trends data uploaded via JSON format")
+print("\nSuccess! Google Trends data uploaded via Parquet format")
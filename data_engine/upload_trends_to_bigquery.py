@@ -9,7 +9,11 @@ import pandas as pd
 from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
 from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import logging
+import orjson
 from dotenv import load_dotenv
 import os
 
@@ -27,6 +31,18 @@ logger = logging.getLogger(__name__)
 class TrendsBigQueryUploader:
     """Handles uploading Google Trends data to BigQuery"""
     
+    SCHEMA = [
+        bigquery.SchemaField("week_start_date", "DATE", mode="REQUIRED", description="Start date of the week (Sunday)"),
+        bigquery.SchemaField("search_term", "STRING", mode="REQUIRED", description="Search term"),
+        bigquery.SchemaField("category", "STRING", mode="REQUIRED", description="Term category: Distress, Affordability, or Inventory"),
+        bigquery.SchemaField("avg_interest_score", "INTEGER", mode="REQUIRED", description="Weekly average interest score (0-100)"),
+        bigquery.SchemaField("region", "STRING", mode="REQUIRED", description="Geographic region"),
+        bigquery.SchemaField("updated_at", "TIMESTAMP", mode="NULLABLE", description="When record was inserted"),
+    ]
+    
+    # Fingerprint of the last successfully uploaded CSV, kept next to it
+    UPLOAD_STATE_FILE = '.trends_upload_state.json'
+    
     def __init__(self, project_id: str, dataset_id: str, table_id: str):
         """
         Initialize uploader
@@ -43,6 +59,7 @@ class TrendsBigQueryUploader:
         
         # Full table reference
         self.table_ref = f"{project_id}.{dataset_id}.{table_id}"
+        self.staging_ref = f"{self.table_ref}_staging"
     
     def table_exists(self) -> bool:
         """Check if table exists"""
@@ -56,16 +73,7 @@ class TrendsBigQueryUploader:
         """Create table with schema"""
         logger.info(f"Creating table {self.table_ref}...")
         
-        schema = [
-            bigquery.SchemaField("week_start_date", "DATE", mode="REQUIRED", description="Start date of the week (Sunday)"),
-            bigquery.SchemaField("search_term", "STRING", mode="REQUIRED", description="Search term"),
-            bigquery.SchemaField("category", "STRING", mode="REQUIRED", description="Term category: Distress, Affordability, or Inventory"),
-            bigquery.SchemaField("avg_interest_score", "INTEGER", mode="REQUIRED", description="Weekly average interest score (0-100)"),
-            bigquery.SchemaField("region", "STRING", mode="REQUIRED", description="Geographic region"),
-            bigquery.SchemaField("updated_at", "TIMESTAMP", mode="NULLABLE", description="When record was inserted"),
-        ]
-        
-        table = bigquery.Table(self.table_ref, schema=schema)
+        table = bigquery.Table(self.table_ref, schema=self.SCHEMA)
         
         # Configure partitioning
         table.time_partitioning = bigquery.TimePartitioning(
@@ -79,38 +87,71 @@ class TrendsBigQueryUploader:
         # Set description
         table.description = "Google Trends weekly average interest scores for housing-related search terms"
         
-        # Create table
-        table = self.client.create_table(table)
+        # Create table (a concurrent creator winning the race is fine)
+        table = self.client.create_table(table, exists_ok=True)
         logger.info(f"✅ Created table {self.table_ref}")
     
-    def get_existing_records(self) -> set:
-        """Get set of existing (week_start_date, search_term, region) tuples to avoid duplicates"""
-        if not self.table_exists():
-            return set()
+    def merge_staging(self, df: pd.DataFrame) -> int:
+        """
+        Insert staged records whose (week_start_date, search_term, region) is not already in the table
+        
+        Args:
+            df: DataFrame that was loaded into the staging table
+            
+        Returns:
+            Number of rows inserted
+        """
+        columns = [field.name for field in self.SCHEMA]
         
+        # Only compare against the weeks, categories, terms and regions being
+        # uploaded so BigQuery prunes partitions and clustered blocks of the
+        # target (a term's category is fixed, so matches are never excluded)
         query = f"""
-        SELECT DISTINCT week_start_date, search_term, region
-        FROM `{self.table_ref}`
+        MERGE `{self.table_ref}` T
+        USING `{self.staging_ref}` S
+        ON T.week_start_date = S.week_start_date
+            AND T.search_term = S.search_term
+            AND T.region = S.region
+            AND T.week_start_date BETWEEN @min_date AND @max_date
+            AND T.category IN UNNEST(@categories)
+            AND T.search_term IN UNNEST(@terms)
+            AND T.region IN UNNEST(@regions)
+        WHEN NOT MATCHED THEN
+            INSERT ({', '.join(columns)})
+            VALUES ({', '.join('S.' + col for col in columns)})
         """
         
-        logger.info("Fetching existing records...")
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter('min_date', 'DATE', df['week_start_date'].min().date()),
+                bigquery.ScalarQueryParameter('max_date', 'DATE', df['week_start_date'].max().date()),
+                bigquery.ArrayQueryParameter('categories', 'STRING', df['category'].unique().tolist()),
+                bigquery.ArrayQueryParameter('terms', 'STRING', df['search_term'].unique().tolist()),
+                bigquery.ArrayQueryParameter('regions', 'STRING', df['region'].unique().tolist()),
+            ]
+        )
         
-        try:
-            result = self.client.query(query).result()
-            records = {(row.week_start_date, row.search_term, row.region) for row in result}
-            logger.info(f"Found {len(records)} existing records")
-            return records
-        except Exception as e:
-            logger.warning(f"Could not fetch existing records: {e}")
-            return set()
+        logger.info("Merging new records from staging table...")
+        job = self.client.query(query, job_config=job_config)
+        job.result()
+        
+        return job.num_dml_affected_rows or 0
     
-    def upload_data(self, csv_file: str, deduplicate: bool = True):
+    def upload_data(
+        self,
+        csv_file: str,
+        deduplicate: bool = True,
+        allow_schema_change: bool = False,
+        force: bool = False
+    ):
         """
         Upload data from CSV to BigQuery
         
         Args:
             csv_file: Path to CSV file
             deduplicate: If True, skip records that already exist
+            allow_schema_change: If True, let an append add new columns to the table
+            force: If True, upload even if this CSV was already uploaded
         """
         logger.info(f"\n{'='*60}")
         logger.info(f"Uploading Google Trends data to BigQuery")
@@ -122,28 +163,44 @@ class TrendsBigQueryUploader:
             logger.error(f"CSV file not found: {csv_file}")
             return
         
-        logger.info(f"Loading data from {csv_file}...")
-        df = pd.read_csv(csv_file, parse_dates=['week_start_date'])
-        logger.info(f"Loaded {len(df)} records")
+        # Skip the whole upload if this exact CSV already went to this table
+        state_file = csv_path.parent / self.UPLOAD_STATE_FILE
+        csv_hash = hashlib.sha256(csv_path.read_bytes()).hexdigest()
+        try:
+            state = orjson.loads(state_file.read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            state = {}
         
-        # Create table if it doesn't exist
-        if not self.table_exists():
-            self.create_table()
+        if not force and state.get('table') == self.table_ref and state.get('hash') == csv_hash:
+            logger.info(f"No change since last upload at {state.get('uploaded_at')}, skipping")
+            return
         
-        # Deduplicate if requested
-        if deduplicate:
-            existing_records = self.get_existing_records()
+        # The table check is a network round trip independent of parsing
+        # the CSV, so run it in the background while the file is read
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            table_exists = executor.submit(self.table_exists)
+            
+            logger.info(f"Loading data from {csv_file}...")
+            df = pd.read_csv(csv_file)
             
-            if existing_records:
-                original_count = len(df)
-                
-                # Create tuple for comparison
-                df['_key'] = list(zip(df['week_start_date'].dt.date, df['search_term'], df['region']))
-                df = df[~df['_key'].isin(existing_records)]
-                df = df.drop(columns=['_key'])
-                
-                logger.info(f"Filtered out {original_count - len(df)} duplicate records")
-                logger.info(f"Uploading {len(df)} new records")
+            # Explicit format; the few distinct weeks are each parsed once
+            df['week_start_date'] = pd.to_datetime(df['week_start_date'], format='%Y-%m-%d', cache=True)
+            logger.info(f"Loaded {len(df)} records")
+        
+        # Collapse repeats within the CSV itself (the MERGE only guards
+        # against keys already in the table)
+        original_count = len(df)
+        df = df.drop_duplicates(
+            subset=['week_start_date', 'search_term', 'region'],
+            keep='last',
+            ignore_index=True
+        )
+        if len(df) < original_count:
+            logger.info(f"Dropped {original_count - len(df)} duplicate rows within the CSV")
+        
+        # Create table if it doesn't exist
+        if not table_exists.result():
+            self.create_table()
         
         if len(df) == 0:
             logger.info("No new data to upload")
@@ -155,37 +212,66 @@ class TrendsBigQueryUploader:
         # Ensure proper data types
         df['avg_interest_score'] = df['avg_interest_score'].astype('Int64')
         
-        # Configure load job
-        job_config = bigquery.LoadJobConfig(
-            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
-            schema_update_options=[
-                bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION
-            ]
-        )
+        # Configure load job: when deduplicating, load into a staging table
+        # and let BigQuery MERGE only new keys into the target; otherwise
+        # append straight to the target
+        if deduplicate:
+            destination = self.staging_ref
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
+                write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+                schema=self.SCHEMA
+            )
+        else:
+            destination = self.table_ref
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.PARQUET,
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+                schema=self.SCHEMA
+            )
+            
+            # Only reconcile the destination schema when evolving it on purpose
+            if allow_schema_change:
+                job_config.schema = None
+                job_config.schema_update_options = [
+                    bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION
+                ]
         
         # Upload to BigQuery
-        logger.info(f"Starting upload to {self.table_ref}...")
+        logger.info(f"Starting upload to {destination}...")
         
         try:
             job = self.client.load_table_from_dataframe(
                 df,
-                self.table_ref,
+                destination,
                 job_config=job_config
             )
             
             # Wait for job to complete
             job.result()
             
+            if deduplicate:
+                uploaded = self.merge_staging(df)
+                logger.info(f"Filtered out {len(df) - uploaded} duplicate records")
+            else:
+                uploaded = len(df)
+            
             logger.info(f"✅ Upload complete!")
-            logger.info(f"Uploaded {len(df)} records")
+            logger.info(f"Uploaded {uploaded} records")
             
-            # Get table info
-            table = self.client.get_table(self.table_ref)
-            logger.info(f"Total rows in table: {table.num_rows:,}")
+            state_file.write_bytes(orjson.dumps({
+                'table': self.table_ref,
+                'hash': csv_hash,
+                'mtime_ns': csv_path.stat().st_mtime_ns,
+                'uploaded_at': datetime.now(timezone.utc).isoformat(),
+            }, option=orjson.OPT_INDENT_2))
             
         except Exception as e:
             logger.error(f"Upload failed: {e}")
             raise
+        finally:
+            if deduplicate:
+                self.client.delete_table(self.staging_ref, not_found_ok=True)
     
     def verify_upload(self):
         """Verify upload with sample queries"""
@@ -193,24 +279,61 @@ class TrendsBigQueryUploader:
         logger.info("Verifying upload...")
         logger.info(f"{'='*60}")
         
-        # Query 1: Total records by category and search term
-        query1 = f"""
+        # Single job: per-term summary rows and the recent high-interest
+        # weeks, told apart by the kind column
+        query = f"""
         SELECT 
+            'summary' as kind,
             category,
             search_term,
             COUNT(*) as record_count,
             MIN(week_start_date) as earliest_week,
             MAX(week_start_date) as latest_week,
-            AVG(avg_interest_score) as avg_interest
+            AVG(avg_interest_score) as avg_interest,
+            CAST(NULL AS DATE) as week_start_date,
+            CAST(NULL AS INT64) as avg_interest_score
         FROM `{self.table_ref}`
         GROUP BY category, search_term
-        ORDER BY category, search_term
+        
+        UNION ALL
+        
+        (
+            SELECT 
+                'recent' as kind,
+                category,
+                search_term,
+                NULL,
+                NULL,
+                NULL,
+                NULL,
+                week_start_date,
+                avg_interest_score
+            FROM `{self.table_ref}`
+            WHERE week_start_date >= @recent_cutoff
+              AND avg_interest_score >= 75
+            ORDER BY week_start_date DESC, avg_interest_score DESC
+            LIMIT 10
+        )
+        
+        ORDER BY kind DESC, week_start_date DESC, avg_interest_score DESC, category, search_term
         """
         
+        # The cutoff is computed here rather than with CURRENT_DATE() so the
+        # query stays deterministic and reruns are served from the cache
+        recent_cutoff = datetime.now(timezone.utc).date() - timedelta(weeks=12)
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter('recent_cutoff', 'DATE', recent_cutoff),
+            ]
+        )
+        
+        rows = list(self.client.query(query, job_config=job_config).result())
+        
         logger.info("\n📊 Records by category and search term:")
-        result = self.client.query(query1).result()
         current_category = None
-        for row in result:
+        for row in rows:
+            if row.kind != 'summary':
+                continue
             if row.category != current_category:
                 logger.info(f"\n  [{row.category}]")
                 current_category = row.category
@@ -219,28 +342,12 @@ class TrendsBigQueryUploader:
             logger.info(f"      Week range: {row.earliest_week} to {row.latest_week}")
             logger.info(f"      Avg interest: {row.avg_interest:.1f}")
         
-        # Query 2: Recent high-interest weeks
-        query2 = f"""
-        SELECT 
-            week_start_date,
-            category,
-            search_term,
-            avg_interest_score
-        FROM `{self.table_ref}`
-        WHERE week_start_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 12 WEEK)
-          AND avg_interest_score >= 75
-        ORDER BY week_start_date DESC, avg_interest_score DESC
-        LIMIT 10
-        """
-        
         logger.info("\n📊 Recent high-interest weeks (score >= 75):")
-        result = self.client.query(query2).result()
-        count = 0
-        for row in result:
+        recent = [row for row in rows if row.kind == 'recent']
+        for row in recent:
             logger.info(f"  {row.week_start_date}: [{row.category}] {row.search_term} = {row.avg_interest_score}")
-            count += 1
         
-        if count == 0:
+        if not recent:
             logger.info("  No high-interest weeks in last 12 weeks")
         
         logger.info("\n✅ Verification complete!")
@@ -253,6 +360,8 @@ def main():
     parser = argparse.ArgumentParser(description='Upload Google Trends data to BigQuery')
     parser.add_argument('--verify-only', action='store_true',
                        help='Only run verification queries')
+    parser.add_argument('--force', action='store_true',
+                       help='Upload even if the CSV is unchanged since the last upload')
     
     args = parser.parse_args()
     
@@ -281,7 +390,7 @@ def main():
         uploader.verify_upload()
     else:
         # Upload data
-        uploader.upload_data(str(csv_file), deduplicate=True)
+        uploader.upload_data(str(csv_file), deduplicate=True, force=args.force)
         
         # Verify
         uploader.verify_upload()